@@ -1,6 +1,9 @@
 import mimetypes
-from services.gemini_client import get_gemini_client
+from services.gemini_client import get_gemini_client, upload_file
+from services.agent_output import FallbackOutput
+from services.near_duplicates import reusable
 
+@reusable("glance")
 def generate_glance_summary(file_path: str, language: str = "English") -> str:
     """
     Produces a concise one-page at-a-glance summary of a legal document.
@@ -9,7 +12,7 @@ def generate_glance_summary(file_path: str, language: str = "English") -> str:
     client = get_gemini_client()
     mime_type, _ = mimetypes.guess_type(file_path)
     mime_type = mime_type or "application/octet-stream"
-    uploaded_file = client.files.upload(file=file_path)
+    uploaded_file = upload_file(client, file_path)
 
     system_prompt = (
         f"You are 'Nyay-Glancer', a multilingual legal brief summarization agent.\n"
@@ -49,4 +52,4 @@ def generate_glance_summary(file_path: str, language: str = "English") -> str:
         contents=[system_prompt, uploaded_file],
     )
 
-    return response.text or "⚠️ No at-a-glance summary generated."
+    return response.text or FallbackOutput("⚠️ No at-a-glance summary generated.")
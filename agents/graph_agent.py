@@ -2,8 +2,9 @@ import os
 import json
 import mimetypes
 from dotenv import load_dotenv
-from services.gemini_client import get_gemini_client
-from neo4j import GraphDatabase
+from services.gemini_client import get_gemini_client, upload_file
+from services.file_utils import file_digest
+from services.knowledge_graph import get_knowledge_graph
 
 # ✅ Load environment variables
 load_dotenv()
@@ -13,18 +14,53 @@ NEO4J_USERNAME = os.getenv("NEO4J_USERNAME")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
 NEO4J_DATABASE = os.getenv("NEO4J_DATABASE", "neo4j")
 
+# Incremental mode merges every document into one cross-case graph.
+# Set GRAPH_INCREMENTAL=false to get the old wipe-and-rebuild demo behaviour.
+GRAPH_INCREMENTAL = os.getenv("GRAPH_INCREMENTAL", "true").lower() != "false"
 
-def build_graph_from_document(file_path: str, language: str = "English") -> str:
+
+def case_id_for(file_path: str, language: str = "English") -> str:
+    """Stable case key: content hash + language (node names are language-specific)."""
+    return f"{file_digest(file_path)[:16]}:{language.lower()}"
+
+
+def build_graph_from_document(file_path: str, language: str = "English",
+                              incremental: bool = GRAPH_INCREMENTAL) -> str:
     """
     Extracts entities & relationships using Gemini and inserts them into Neo4j.
     Returns graph JSON for D3 visualization.
+
+    In incremental mode entities are resolved against previously seen cases,
+    only new nodes/edges are written, and a document already merged is served
+    straight from the in-process adjacency cache.
     """
+    if incremental:
+        graph = get_knowledge_graph()
+        case_id = case_id_for(file_path, language)
+        if graph.has_case(case_id):
+            print(f"♻️ Graph for case {case_id} served from adjacency cache.")
+            return json.dumps(graph.case_graph(case_id), indent=2)
+        graph_data = _extract_graph(file_path, language)
+        try:
+            return json.dumps(graph.merge_document(case_id, graph_data), indent=2)
+        except Exception as e:
+            # Nothing was cached, so the next request retries the merge.
+            print(f"❌ Graph merge failed for case {case_id}: {e}")
+            return json.dumps(graph_data, indent=2)
+
+    graph_data = _extract_graph(file_path, language)
+    _rebuild_neo4j(graph_data)
+    return json.dumps(graph_data, indent=2)
+
+
+def _extract_graph(file_path: str, language: str) -> dict:
+    """Asks Gemini for the document's {nodes, edges}."""
     client = get_gemini_client()
 
     # Upload file to Gemini
     mime_type, _ = mimetypes.guess_type(file_path)
     mime_type = mime_type or "application/octet-stream"
-    uploaded_file = client.files.upload(file=file_path)
+    uploaded_file = upload_file(client, file_path)
 
     system_prompt = (
     f"You are 'Nyay-Graph', an investigative legal case analyst.\n"
@@ -60,11 +96,19 @@ def build_graph_from_document(file_path: str, language: str = "English") -> str:
     except Exception:
         print("⚠️ Gemini response was not valid JSON — fallback to empty graph.")
         graph_data = {"nodes": [], "edges": []}
+    if not isinstance(graph_data, dict):
+        graph_data = {"nodes": [], "edges": []}
+    return graph_data
+
+
+def _rebuild_neo4j(graph_data: dict) -> None:
+    """Demo mode: replaces the whole Neo4j graph with this one document."""
+    from neo4j import GraphDatabase
 
     # Ensure credentials
     if not all([NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD]):
         print("⚠️ Missing Neo4j credentials! Check your .env file.")
-        return json.dumps(graph_data, indent=2)
+        return
 
     # ✅ Safe connection to Neo4j
     driver = None
@@ -99,5 +143,3 @@ def build_graph_from_document(file_path: str, language: str = "English") -> str:
     finally:
         if driver:
             driver.close()
-
-    return json.dumps(graph_data, indent=2)
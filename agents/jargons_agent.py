@@ -1,6 +1,9 @@
 import mimetypes
-from services.gemini_client import get_gemini_client
+from services.gemini_client import get_gemini_client, upload_file
+from services.agent_output import FallbackOutput
+from services.near_duplicates import reusable
 
+@reusable("jargons")
 def explain_jargons(file_path: str, language: str = "English") -> str:
     """
     Detects and explains complex legal or Latin terms,
@@ -11,7 +14,7 @@ def explain_jargons(file_path: str, language: str = "English") -> str:
     # Upload file to Gemini
     mime_type, _ = mimetypes.guess_type(file_path)
     mime_type = mime_type or "application/octet-stream"
-    uploaded_file = client.files.upload(file=file_path)
+    uploaded_file = upload_file(client, file_path)
 
     system_prompt = (
         f"You are 'Nyay-Terms', a multilingual legal term explainer.\n"
@@ -40,4 +43,4 @@ def explain_jargons(file_path: str, language: str = "English") -> str:
     if text.startswith("```"):
         text = text.replace("```json", "").replace("```", "").strip()
 
-    return response.text or "⚠️ No jargons detected or explanation generated."
+    return response.text or FallbackOutput("⚠️ No jargons detected or explanation generated.")
@@ -1,6 +1,9 @@
 import mimetypes
-from services.gemini_client import get_gemini_client
+from services.gemini_client import get_gemini_client, upload_file
+from services.agent_output import FallbackOutput
+from services.near_duplicates import reusable
 
+@reusable("related")
 def find_related_cases(file_path: str, language: str = "English") -> str:
     """
     Uses Gemini to extract the case context and then search for 
@@ -12,7 +15,7 @@ def find_related_cases(file_path: str, language: str = "English") -> str:
     client = get_gemini_client()
 
     # Upload file first
-    uploaded_file = client.files.upload(file=file_path)
+    uploaded_file = upload_file(client, file_path)
 
     system_prompt = (
         f"You are 'Nyay-Linker', a multilingual Legal Case Relation Agent.\n"
@@ -45,4 +48,4 @@ def find_related_cases(file_path: str, language: str = "English") -> str:
         contents=[system_prompt, uploaded_file],
     )
 
-    return response.text or "⚠️ No related cases found."
\ No newline at end of file
+    return response.text or FallbackOutput("⚠️ No related cases found.")
\ No newline at end of file
@@ -1,6 +1,9 @@
 import mimetypes
-from services.gemini_client import get_gemini_client
+from services.gemini_client import get_gemini_client, upload_file
+from services.agent_output import FallbackOutput
+from services.near_duplicates import reusable
 
+@reusable("summary")
 def summarize_file(file_path: str, language: str) -> str:
     """
     Handles any file type: PDF, JPG, PNG, DOCX, etc.
@@ -12,7 +15,7 @@ def summarize_file(file_path: str, language: str) -> str:
     client = get_gemini_client()
 
     # Upload file to Gemini first
-    uploaded_file = client.files.upload(file=file_path)
+    uploaded_file = upload_file(client, file_path)
 
     system_prompt = (
     f"You are 'Nyay-Summarizer', a multilingual Legal Document Summarization Agent.\n"
@@ -74,4 +77,4 @@ def summarize_file(file_path: str, language: str) -> str:
         contents=[system_prompt, uploaded_file]
     )
 
-    return response.text or "No summary generated."
+    return response.text or FallbackOutput("No summary generated.")
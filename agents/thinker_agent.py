@@ -1,7 +1,7 @@
 # agents/thinker_agent.py
 from typing import List, Dict, Optional
 import mimetypes
-from services.gemini_client import get_gemini_client
+from services.gemini_client import get_gemini_client, upload_file
 
 def chat_with_thinker(history: List[Dict[str, str]], language: str = "English", files: Optional[List[str]] = None) -> str:
     """
@@ -20,7 +20,7 @@ def chat_with_thinker(history: List[Dict[str, str]], language: str = "English",
             mime_type, _ = mimetypes.guess_type(file_path)
             mime_type = mime_type or "application/octet-stream"
             try:
-                uploaded_file = client.files.upload(file=file_path)
+                uploaded_file = upload_file(client, file_path)
                 uploaded_refs.append(uploaded_file)
             except Exception as e:
                 print("File upload failed:", e)
@@ -1,7 +1,10 @@
 import json, mimetypes, re
-from services.gemini_client import get_gemini_client
+from services.gemini_client import get_gemini_client, upload_file
+from services.agent_output import FallbackOutput
+from services.near_duplicates import reusable
 import os
 
+@reusable("timeline")
 def extract_timeline(file_path: str, language: str = "English") -> str:
     """
     Generates a structured chronological timeline from legal documents.
@@ -27,7 +30,7 @@ def extract_timeline(file_path: str, language: str = "English") -> str:
 
     # Upload to Gemini
     try:
-        uploaded_file = client.files.upload(file=safe_path)
+        uploaded_file = upload_file(client, safe_path)
     except Exception as e:
         print(f"❌ Gemini file upload failed: {e}", flush=True)
         uploaded_file = None
@@ -128,5 +131,5 @@ def extract_timeline(file_path: str, language: str = "English") -> str:
             "description": desc
         })
     print(" Gemini timeline raw output:", text[:300])
-    # ✅ Always return valid JSON array
-    return json.dumps(timeline, indent=2)
\ No newline at end of file
+    # ✅ Always return valid JSON array (marked as a fallback so it is never reused)
+    return FallbackOutput(json.dumps(timeline, indent=2))
\ No newline at end of file
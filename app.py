@@ -1,9 +1,17 @@
 from flask import Flask, render_template, request, jsonify, session, redirect, url_for
 from werkzeug.utils import secure_filename
 import os
+import json
+import re
+import uuid
+from concurrent.futures import CancelledError
 
-from agents.summarizer_agent import summarize_file
-# in future you’ll import other agents here
+from services.scheduler import INTERACTIVE, get_scheduler, parse_priority
+from services.warmup import STARTUP_TIMINGS, warm_clients_in_background
+
+# Agent modules (and google-genai / neo4j behind them) are imported inside the
+# routes that need them, so importing this module stays fast on cold start.
+# Under gunicorn they are preloaded in the master instead (see gunicorn.conf.py).
 
 app = Flask(__name__)
 UPLOAD_FOLDER = os.path.join("/tmp", "uploads")
@@ -12,6 +20,32 @@ app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 
 app.secret_key = "secret_key_for_demo"
 
+def _session_id() -> str:
+    if "sid" not in session:
+        session["sid"] = uuid.uuid4().hex
+    return session["sid"]
+
+def _queue_key(page_token=None) -> str:
+    """
+    Scheduler key for this request: the session id plus the dashboard's
+    per-page-load token (`X-Page-Token`), so a reload's old page can only
+    cancel its own calls, never the new page's.
+    """
+    token = page_token if page_token is not None else request.headers.get("X-Page-Token", "")
+    token = re.sub(r"[^\w-]", "", token or "")[:64]
+    return f"{_session_id()}:{token}" if token else _session_id()
+
+def run_agent(agent: str, fn, *args, priority=None, **kwargs):
+    """
+    Runs an agent call through the priority scheduler. The priority comes from
+    the `X-Agent-Priority` header (interactive / foreground / background),
+    falling back to the agent's default.
+    """
+    if priority is None:
+        priority = parse_priority(request.headers.get("X-Agent-Priority"), agent)
+    return get_scheduler().run(fn, *args, agent=agent, session_id=_queue_key(),
+                               priority=priority, **kwargs)
+
 @app.route("/", methods=["GET", "POST"])
 def welcome():
     if request.method == "POST":
@@ -26,6 +60,9 @@ def welcome():
                 file.save(path)
                 saved_files.append(path)
 
+        # A new upload supersedes anything still queued for the old one.
+        get_scheduler().cancel_session(_session_id())
+
         # Store in session
         session["language"] = request.form.get("language", "English")
         session["files"] = saved_files
@@ -35,20 +72,25 @@ def welcome():
 
 @app.route("/dashboard")
 def dashboard():
-    summary_text, jargon_text = None, None
+    summary_text = None
     language = session.get("language", "English")
     files = session.get("files", [])
 
     if files:
-        summary_text = summarize_file(files[0], language)
-        jargon_text = explain_jargons(files[0], language)
+        from agents.summarizer_agent import summarize_file
+
+        # The page render waits on this, so it jumps every queue.
+        # (Jargons are fetched by their own panel via /api/jargons.)
+        try:
+            summary_text = run_agent("summary", summarize_file, files[0], language, priority=INTERACTIVE)
+        except CancelledError:
+            # A new upload (e.g. from another tab) superseded this page.
+            summary_text = "⚠️ Summary request was cancelled. Reload the page to try again."
 
-    # Pass both results to frontend
     return render_template(
         "dashboard.html",
         language=language,
         summary=summary_text,
-        jargons=jargon_text,
     )
 
 # these endpoints will later call the right agents dynamically
@@ -56,11 +98,14 @@ def dashboard():
 def summarizer_api():
     if not request.json:
         return jsonify({"error": "Invalid JSON"}), 400
+    from agents.summarizer_agent import summarize_file
+
     path = request.json.get("path")
     language = session.get("language", "English")
-    return jsonify({"output": summarize_file(path, language)})
-
-from agents.related_cases_agent import find_related_cases
+    try:
+        return jsonify({"output": run_agent("summary", summarize_file, path, language)})
+    except CancelledError:
+        return jsonify({"output": "⚠️ Summary request was cancelled."})
 
 @app.route("/api/related_cases", methods=["POST"])
 def related_cases_api():
@@ -71,7 +116,9 @@ def related_cases_api():
         if not files:
             return jsonify({"output": "⚠️ No file found."})
 
-        result = find_related_cases(files[0], language)
+        from agents.related_cases_agent import find_related_cases
+
+        result = run_agent("related", find_related_cases, files[0], language)
         return jsonify({"output": result})
     except Exception as e:
         print(f"Related Cases API error: {e}")
@@ -79,8 +126,6 @@ def related_cases_api():
 
 
 
-from agents.jargons_agent import explain_jargons
-
 @app.route("/api/jargons", methods=["POST"])
 def jargon_api():
     files = session.get("files", [])
@@ -89,12 +134,15 @@ def jargon_api():
     if not files:
         return jsonify({"output": "⚠️ No file uploaded."})
 
-    jargons_md = explain_jargons(files[0], language)
-    return jsonify({"output": jargons_md})
+    from agents.jargons_agent import explain_jargons
 
+    try:
+        jargons_md = run_agent("jargons", explain_jargons, files[0], language)
+    except CancelledError:
+        return jsonify({"output": "⚠️ Jargon request was cancelled."})
+    return jsonify({"output": jargons_md})
 
 
-from agents.thinker_agent import chat_with_thinker
 
 @app.route("/api/thinker_chat", methods=["POST"])
 def thinker_chat():
@@ -105,11 +153,14 @@ def thinker_chat():
     session["thinker_history"] = history
     files = session.get("files", [])
 
-    reply = chat_with_thinker(history, language=language, files=files)
-    return jsonify({"reply": reply})
+    from agents.thinker_agent import chat_with_thinker
 
+    try:
+        reply = run_agent("thinker", chat_with_thinker, history, language=language, files=files)
+    except CancelledError:
+        return jsonify({"reply": "⚠️ Request was cancelled. Please ask again."})
+    return jsonify({"reply": reply})
 
-from agents.timeline_agent import extract_timeline
 
 @app.route("/api/timeline", methods=["POST"])
 def timeline_api():
@@ -123,14 +174,14 @@ def timeline_api():
         
         file_path = files[0]
         print(f"🕒 Timeline agent started for file: {file_path}")
-        output = extract_timeline(files[0], language)
+        from agents.timeline_agent import extract_timeline
+
+        output = run_agent("timeline", extract_timeline, files[0], language)
         return jsonify({"output": output})
     except Exception as e:
         print(f"Timeline API error: {e}")
         return jsonify({"output": "[]"})
 
-from agents.at_a_glance_agent import generate_glance_summary
-
 @app.route("/api/glance", methods=["POST"])
 def glance_api():
     try:
@@ -140,7 +191,9 @@ def glance_api():
         if not files:
             return jsonify({"output": "⚠️ No file found."})
 
-        result = generate_glance_summary(files[0], language)
+        from agents.at_a_glance_agent import generate_glance_summary
+
+        result = run_agent("glance", generate_glance_summary, files[0], language)
         return jsonify({"output": result})
     except Exception as e:
         print(f"At-a-Glance API error: {e}")
@@ -148,8 +201,6 @@ def glance_api():
 
 
 
-from agents.readiness_agent import prepare_hearing_readiness
-
 @app.route("/api/readiness", methods=["POST"])
 def readiness_api():
     try:
@@ -159,14 +210,16 @@ def readiness_api():
         if not files:
             return jsonify({"output": "⚠️ No file found."})
 
-        result = prepare_hearing_readiness(files[0], language)
+        from agents.readiness_agent import prepare_hearing_readiness
+
+        result = run_agent("readiness", prepare_hearing_readiness, files[0], language)
         return jsonify({"output": result})
     except Exception as e:
         print(f"Readiness API error: {e}")
         return jsonify({"output": "⚠️ Failed to generate readiness brief."})
 
 
-from agents.graph_agent import build_graph_from_document
+from services.knowledge_graph import get_knowledge_graph
 
 @app.route("/api/graph", methods=["POST"])
 def graph_api():
@@ -174,14 +227,212 @@ def graph_api():
     files = session.get("files", [])
     if not files:
         return jsonify({"output": "⚠️ No file found in session."})
-    result = build_graph_from_document(files[0], language)
+    from agents.graph_agent import build_graph_from_document
+
+    try:
+        result = run_agent("graph", build_graph_from_document, files[0], language)
+    except CancelledError:
+        return jsonify({"output": "⚠️ Graph request was cancelled."})
     return jsonify({"output": result})
 
+@app.route("/api/graph/case", methods=["GET"])
+def graph_case_api():
+    """Cached D3 graph for the session's case (no Gemini or Neo4j round trip)."""
+    language = session.get("language", "English")
+    files = session.get("files", [])
+    if not files:
+        return jsonify({"output": "⚠️ No file found in session."})
+    from agents.graph_agent import case_id_for
+
+    graph = get_knowledge_graph().case_graph(case_id_for(files[0], language))
+    return jsonify({"output": json.dumps(graph)})
+
+@app.route("/api/graph/neighbourhood", methods=["GET"])
+def graph_neighbourhood_api():
+    """Cross-case neighbourhood of one entity, e.g. every matter a judge presided over."""
+    node_id = request.args.get("node", "")
+    depth = min(request.args.get("depth", 1, type=int), 3)
+    if not node_id:
+        return jsonify({"error": "Missing 'node' parameter."}), 400
+    graph = get_knowledge_graph().neighbourhood(node_id, depth)
+    return jsonify({"output": json.dumps(graph)})
+
+@app.route("/api/duplicate", methods=["GET"])
+def duplicate_api():
+    """Reports an already analysed near-duplicate of the session's file, if any."""
+    files = session.get("files", [])
+    language = session.get("language", "English")
+    if not files:
+        return jsonify({"output": None})
+    try:
+        from services.near_duplicates import audit_offer, find_duplicate
+
+        match = find_duplicate(files[0], language)
+        if match and match["match_sha256"] in session.get("declined_duplicates", []):
+            match = None
+        if match and match["agents"]:
+            audit_offer(files[0], match, language)  # the dashboard shows this as an offer
+        return jsonify({"output": match})
+    except Exception as e:
+        print(f"Duplicate API error: {e}")
+        return jsonify({"output": None})
+
+@app.route("/api/duplicate/accept", methods=["POST"])
+def duplicate_accept_api():
+    """The user confirmed the offered match: reuse its stored outputs for this file."""
+    files = session.get("files", [])
+    match_sha = (request.get_json(silent=True) or {}).get("match_sha256", "")
+    if not files or not match_sha:
+        return jsonify({"error": "No file or match given."}), 400
+    try:
+        from services.near_duplicates import accept_duplicate
+
+        agents = accept_duplicate(files[0], match_sha, session.get("language", "English"))
+        return jsonify({"output": agents})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route("/api/duplicate/decline", methods=["POST"])
+def duplicate_decline_api():
+    """The user rejected the offered match: don't offer it again in this session."""
+    files = session.get("files", [])
+    match_sha = (request.get_json(silent=True) or {}).get("match_sha256", "")
+    if not files or not match_sha:
+        return jsonify({"error": "No file or match given."}), 400
+    from services.near_duplicates import decline_duplicate
+
+    decline_duplicate(files[0], match_sha, session.get("language", "English"))
+    session["declined_duplicates"] = session.get("declined_duplicates", []) + [match_sha]
+    return jsonify({"output": "declined"})
+
+@app.route("/api/duplicate/invalidate", methods=["POST"])
+def duplicate_invalidate_api():
+    """
+    Drops stored agent outputs so they are regenerated: pass `sha256` and/or
+    `agent`, or nothing to clear the session file's outputs.
+    """
+    from services.file_utils import file_digest
+    from services.near_duplicates import invalidate_outputs
+
+    data = request.get_json(silent=True) or {}
+    sha, agent = data.get("sha256"), data.get("agent")
+    files = session.get("files", [])
+    if not sha and not agent:
+        if not files:
+            return jsonify({"error": "No file found in session."}), 400
+        sha = file_digest(files[0])
+    return jsonify({"invalidated": invalidate_outputs(sha, agent)})
+
+@app.route("/api/duplicate/audit", methods=["GET"])
+def duplicate_audit_api():
+    """Most recent reuse decisions (exact / reused / facts_differ / offered / accepted / declined)."""
+    from services.near_duplicates import recent_audit
+
+    limit = min(request.args.get("limit", 50, type=int), 500)
+    return jsonify({"output": recent_audit(limit)})
+
+from services.batch_runner import batch_job_status, start_batch_job
+from services.scheduler import BULK
+
+# Server-side batch runs may only read from (and write under) this directory.
+BATCH_ROOT = os.path.abspath(os.getenv("BATCH_ROOT", UPLOAD_FOLDER))
+BATCH_OUTPUT = os.path.join(BATCH_ROOT, "batch_output")
+
+@app.route("/api/batch", methods=["POST"])
+def batch_api():
+    """
+    Starts a background batch run over many documents and returns its job id.
+    Accepts either multipart `case_files` uploads or JSON with a `directory`
+    and/or `files` list (paths must live under BATCH_ROOT).
+    Poll GET /api/batch/<job_id> for progress.
+    """
+    try:
+        data = request.get_json(silent=True) or request.form.to_dict()
+        language = data.get("language") or session.get("language", "English")
+        agents = data.get("agents") or None
+        if isinstance(agents, str):
+            agents = [a.strip() for a in agents.split(",") if a.strip()]
+        workers = min(int(data.get("workers", 2)), 8)
+
+        inputs = []
+        for file in request.files.getlist("case_files"):
+            if file.filename:
+                path = os.path.join(UPLOAD_FOLDER, secure_filename(file.filename))
+                file.save(path)
+                inputs.append(path)
+
+        requested = data.get("files") or []
+        if isinstance(requested, str):
+            requested = [f.strip() for f in requested.split(",") if f.strip()]
+        requested = list(requested)
+        if data.get("directory"):
+            requested.append(data["directory"])
+        for item in requested:
+            path = os.path.abspath(os.path.join(BATCH_ROOT, item))
+            if os.path.commonpath([path, BATCH_ROOT]) != BATCH_ROOT:
+                return jsonify({"error": f"Path outside batch root: {item}"}), 400
+            inputs.append(path)
+
+        if not inputs:
+            return jsonify({"error": "No files or directory given."}), 400
+
+        # Batch calls share the agent scheduler at the lowest priority, so a
+        # long run never competes with dashboard users for Gemini capacity.
+        job_id = uuid.uuid4().hex[:12]
+
+        def call(agent, fn, path, lang):
+            return get_scheduler().run(fn, path, lang, agent=agent,
+                                       session_id=f"batch:{job_id}", priority=BULK)
+
+        start_batch_job(inputs, agents=agents, language=language, output_dir=BATCH_OUTPUT,
+                        workers=workers, call=call, job_id=job_id)
+        return jsonify({"job_id": job_id, "status_url": url_for("batch_status_api", job_id=job_id)}), 202
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Batch API error: {e}")
+        return jsonify({"error": "⚠️ Batch run failed."}), 500
+
+@app.route("/api/batch/<job_id>", methods=["GET"])
+def batch_status_api(job_id):
+    """Batch job status and progress (read back from the checkpoint)."""
+    status = batch_job_status(BATCH_OUTPUT, job_id)
+    if status is None:
+        return jsonify({"error": "Unknown batch job."}), 404
+    return jsonify({"output": status})
+
+@app.route("/api/scheduler/promote", methods=["POST"])
+def scheduler_promote_api():
+    """The user opened `panel`: move its queued agent call ahead of background work."""
+    panel = (request.get_json(silent=True) or {}).get("panel", "")
+    moved = get_scheduler().promote(_queue_key(), panel, INTERACTIVE)
+    return jsonify({"promoted": moved})
+
+@app.route("/api/session/end", methods=["POST"])
+def session_end_api():
+    """
+    Sent via navigator.sendBeacon when the dashboard is closed, with the page's
+    token in the body (beacons can't set headers). Only that page's calls are cancelled.
+    """
+    page = (request.get_json(force=True, silent=True) or {}).get("page")
+    cancelled = get_scheduler().cancel_session(_queue_key(page))
+    return jsonify({"cancelled": cancelled})
+
+@app.route("/api/scheduler", methods=["GET"])
+def scheduler_stats_api():
+    return jsonify(get_scheduler().stats())
+
 @app.route("/healthz")
 def healthz():
     """Simple health check for Azure container probes."""
     return "OK", 200
 
+@app.route("/startupz")
+def startupz():
+    """Startup-timing report: module preload and per-worker client warm-up."""
+    return jsonify(STARTUP_TIMINGS)
+
 if __name__ == "__main__":
     print(" Flask app starting on port 80...")
+    warm_clients_in_background()
     app.run(host="0.0.0.0", port=80, debug=True)
@@ -1,5 +1,33 @@
 # gunicorn.conf.py
 timeout = 800 
 workers = 1
-threads = 2
-bind = "0.0.0.0:80"
\ No newline at end of file
+# Request threads mostly wait on the agent scheduler, which caps concurrent
+# Gemini calls separately (SCHEDULER_WORKERS, default 2) and orders them by
+# priority — so extra threads add queue slots, not Gemini load.
+threads = 8
+bind = "0.0.0.0:80"
+
+# Import the app (and every heavy module behind it) once in the master so
+# workers fork with it already loaded and share those pages copy-on-write.
+preload_app = True
+
+
+def on_starting(server):
+    # Fork-safe: only imports code, opens no sockets or threads.
+    from services.warmup import preload_modules
+
+    preload_modules()
+
+
+def post_fork(server, worker):
+    # Network clients (Gemini HTTP pool, Neo4j driver) are created per worker,
+    # in the background so /healthz answers while they connect.
+    from services.warmup import warm_clients_in_background
+
+    warm_clients_in_background()
+
+
+def when_ready(server):
+    from services.warmup import STARTUP_TIMINGS
+
+    server.log.info("Preloaded in %ss: %s", STARTUP_TIMINGS.get("preload_s"), STARTUP_TIMINGS["modules"])
@@ -0,0 +1,20 @@
+"""
+Marking agent results that are not real results.
+
+Kept free of heavy imports: both the near-duplicate store and the batch
+runner (imported at app start-up) check outputs with `is_placeholder`.
+"""
+
+
+class FallbackOutput(str):
+    """
+    A placeholder an agent returns instead of a real result ("No summary
+    generated.", the canned timeline stages). Shown to the user like any other
+    string, but never stored for reuse or checkpointed as done.
+    """
+
+
+def is_placeholder(output) -> bool:
+    """True for empty, `FallbackOutput` and "⚠️ …" results."""
+    return (not isinstance(output, str) or not output
+            or isinstance(output, FallbackOutput) or output.startswith("⚠️"))
@@ -0,0 +1,329 @@
+"""
+Batch case processing — runs the selected agents over a directory or a list
+of case files with bounded parallelism.
+
+Progress is checkpointed to an append-only JSONL file so an interrupted run
+can be resumed, and every document gets one compact gzipped JSON record in
+the output store.
+
+Usage:
+    python -m services.batch_runner uploads/ --agents summary,glance --workers 4
+"""
+import argparse
+import gzip
+import importlib
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, List, Optional
+
+from services.agent_output import is_placeholder
+from services.file_utils import file_digest
+
+# Agent name → (module, function). Imported lazily so that a batch run only
+# loads the agents it actually needs.
+AGENT_REGISTRY = {
+    "summary": ("agents.summarizer_agent", "summarize_file"),
+    "jargons": ("agents.jargons_agent", "explain_jargons"),
+    "timeline": ("agents.timeline_agent", "extract_timeline"),
+    "graph": ("agents.graph_agent", "build_graph_from_document"),
+    "related": ("agents.related_cases_agent", "find_related_cases"),
+    "glance": ("agents.at_a_glance_agent", "generate_glance_summary"),
+    "readiness": ("agents.readiness_agent", "prepare_hearing_readiness"),
+}
+DEFAULT_AGENTS = ["summary", "jargons", "glance"]
+
+SUPPORTED_EXTENSIONS = {".pdf", ".png", ".jpg", ".jpeg", ".webp", ".docx", ".txt"}
+CHECKPOINT_NAME = "checkpoint.jsonl"
+JOBS_DIR = "jobs"
+
+
+def _direct_call(agent: str, fn: Callable, path: str, language: str):
+    return fn(path, language)
+
+
+def document_key(path: str, language: str, digest: Optional[str] = None) -> str:
+    """Output-store / checkpoint key for one document in one language."""
+    digest = digest or file_digest(path)
+    return f"{digest[:32]}-{language.lower()}"
+
+
+def resolve_agent(name: str):
+    """Returns the agent callable registered under `name`."""
+    if name not in AGENT_REGISTRY:
+        raise ValueError(f"Unknown agent '{name}'. Choose from: {', '.join(AGENT_REGISTRY)}")
+    module_name, func_name = AGENT_REGISTRY[name]
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def collect_files(inputs: Iterable[str]) -> List[str]:
+    """Expands directories into their supported case files (sorted, de-duplicated)."""
+    found = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, names in os.walk(item):
+                for name in names:
+                    if os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS:
+                        found.append(os.path.join(root, name))
+        elif os.path.isfile(item):
+            found.append(item)
+        else:
+            print(f"⚠️ Skipping missing path: {item}")
+    return sorted(set(os.path.abspath(p) for p in found))
+
+
+class OutputStore:
+    """One gzipped JSON record per (document, language) under `root`."""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.json.gz")
+
+    def load(self, key: str) -> Optional[Dict]:
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save(self, key: str, record: Dict) -> None:
+        # Write-then-rename so a crash never leaves a truncated record behind.
+        tmp = self._path(key) + ".tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, self._path(key))
+
+
+class Checkpoint:
+    """Append-only log of completed (document key, agent) pairs."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._done = set()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self._done.add((entry["key"], entry["agent"]))
+                    except Exception:
+                        continue  # tolerate a partially written last line
+
+    def is_done(self, key: str, agent: str) -> bool:
+        return (key, agent) in self._done
+
+    def mark(self, key: str, agent: str) -> None:
+        with self._lock:
+            self._done.add((key, agent))
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"key": key, "agent": agent}) + "\n")
+
+
+def _process_document(path: str, agents: List[str], language: str,
+                      store: OutputStore, checkpoint: Checkpoint, call: Callable) -> Dict:
+    """Runs every pending agent for one document and persists its record."""
+    digest = file_digest(path)
+    key = document_key(path, language, digest)
+    record = store.load(key) or {
+        "file": os.path.basename(path),
+        "sha256": digest,
+        "language": language,
+        "outputs": {},
+        "errors": {},
+    }
+
+    stats = {"file": path, "key": key, "ran": 0, "skipped": 0, "failed": 0}
+    for agent in agents:
+        if checkpoint.is_done(key, agent) and agent in record["outputs"]:
+            stats["skipped"] += 1
+            continue
+        started = time.perf_counter()
+        try:
+            output = call(agent, resolve_agent(agent), path, language)
+            # A placeholder (Gemini failed, agent fell back) is a failure too:
+            # don't checkpoint it, so a resumed run retries this agent.
+            if is_placeholder(output):
+                raise RuntimeError(f"placeholder result: {str(output)[:80]!r}")
+            record["outputs"][agent] = output
+            record["errors"].pop(agent, None)
+            stats["ran"] += 1
+        except Exception as e:
+            print(f"❌ Batch agent '{agent}' failed for {os.path.basename(path)}: {e}")
+            record["errors"][agent] = str(e)
+            stats["failed"] += 1
+            continue
+        finally:
+            record.setdefault("timings", {})[agent] = round(time.perf_counter() - started, 2)
+        # Persist after each agent so a crash loses at most one call.
+        store.save(key, record)
+        checkpoint.mark(key, agent)
+
+    if stats["failed"]:
+        store.save(key, record)
+    return stats
+
+
+def run_batch(inputs: Iterable[str], agents: Optional[List[str]] = None,
+              language: str = "English", output_dir: str = "batch_output",
+              workers: int = 2, call: Optional[Callable] = None) -> Dict:
+    """
+    Processes every case file found in `inputs` with the selected agents.
+    Documents run in parallel (at most `workers` at a time); agents for a single
+    document run sequentially. Already-completed work is skipped on resume.
+    `call(agent, fn, path, language)` performs each agent call (the web app routes
+    it through the agent scheduler). Returns a throughput report.
+    """
+    call = call or _direct_call
+    agents = agents or DEFAULT_AGENTS
+    for name in agents:
+        resolve_agent(name)  # fail fast on typos before any upload happens
+
+    files = collect_files(inputs)
+    store = OutputStore(output_dir)
+    checkpoint = Checkpoint(os.path.join(output_dir, CHECKPOINT_NAME))
+
+    print(f"📦 Batch started: {len(files)} file(s), agents={agents}, workers={workers}")
+    started = time.perf_counter()
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {
+            pool.submit(_process_document, path, agents, language, store, checkpoint, call): path
+            for path in files
+        }
+        for i, future in enumerate(as_completed(futures), 1):
+            path = futures[future]
+            try:
+                results.append(future.result())
+            except Exception as e:
+                # Unreadable file etc. — record it and keep the batch going.
+                print(f"❌ Batch failed for {path}: {e}")
+                results.append({"file": path, "key": None, "ran": 0, "skipped": 0,
+                                "failed": len(agents)})
+            print(f"   [{i}/{len(files)}] {os.path.basename(path)}")
+
+    elapsed = time.perf_counter() - started
+    ran = sum(r["ran"] for r in results)
+    report = {
+        "documents": len(files),
+        "agent_calls": ran,
+        "skipped": sum(r["skipped"] for r in results),
+        "failed": sum(r["failed"] for r in results),
+        "elapsed_s": round(elapsed, 2),
+        "docs_per_min": round(len(files) / elapsed * 60, 2) if elapsed else 0.0,
+        "calls_per_min": round(ran / elapsed * 60, 2) if elapsed else 0.0,
+        "output_dir": os.path.abspath(output_dir),
+        "results": results,
+    }
+    print(f"✅ Batch finished in {report['elapsed_s']}s — "
+          f"{report['docs_per_min']} docs/min, {report['failed']} failure(s).")
+    return report
+
+
+# ----------------------------------------------
+# 🧵 Background jobs (used by /api/batch)
+# ----------------------------------------------
+def _manifest_path(output_dir: str, job_id: str) -> str:
+    return os.path.join(output_dir, JOBS_DIR, f"{job_id}.json")
+
+
+def _write_manifest(output_dir: str, manifest: Dict) -> None:
+    path = _manifest_path(output_dir, manifest["id"])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+def start_batch_job(inputs: Iterable[str], agents: Optional[List[str]] = None,
+                    language: str = "English", output_dir: str = "batch_output",
+                    workers: int = 2, call: Optional[Callable] = None,
+                    job_id: Optional[str] = None) -> str:
+    """
+    Starts `run_batch` in a background thread and returns its job id at once.
+    The job manifest lists every (document, agent) pair, so progress can be
+    read back from the checkpoint with `batch_job_status`.
+    """
+    agents = agents or DEFAULT_AGENTS
+    for name in agents:
+        resolve_agent(name)
+    inputs = list(inputs)
+    job_id = job_id or uuid.uuid4().hex[:12]
+    manifest = {"id": job_id, "status": "preparing", "created": time.time(),
+                "agents": agents, "language": language, "documents": []}
+    _write_manifest(output_dir, manifest)
+
+    def _run():
+        try:
+            files = collect_files(inputs)
+            manifest["documents"] = [{"file": p, "key": document_key(p, language)} for p in files]
+            manifest["status"] = "running"
+            _write_manifest(output_dir, manifest)
+            report = run_batch(files, agents=agents, language=language,
+                               output_dir=output_dir, workers=workers, call=call)
+            report.pop("results")
+            manifest.update(status="finished", report=report)
+        except Exception as e:
+            print(f"❌ Batch job {job_id} failed: {e}")
+            manifest.update(status="failed", error=str(e))
+        manifest["finished"] = time.time()
+        _write_manifest(output_dir, manifest)
+
+    threading.Thread(target=_run, name=f"batch-{job_id}", daemon=True).start()
+    return job_id
+
+
+def batch_job_status(output_dir: str, job_id: str) -> Optional[Dict]:
+    """Job manifest plus progress counted from the checkpoint; None for unknown ids."""
+    path = _manifest_path(output_dir, os.path.basename(job_id))
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    checkpoint = Checkpoint(os.path.join(output_dir, CHECKPOINT_NAME))
+    total = len(manifest["documents"]) * len(manifest["agents"])
+    done = sum(
+        checkpoint.is_done(doc["key"], agent)
+        for doc in manifest["documents"] for agent in manifest["agents"]
+    )
+    manifest.pop("documents")
+    elapsed = (manifest.get("finished") or time.time()) - manifest["created"]
+    manifest["progress"] = {
+        "done": done,
+        "total": total,
+        "percent": round(100 * done / total, 1) if total else 0.0,
+        "calls_per_min": round(done / elapsed * 60, 2) if elapsed else 0.0,
+    }
+    return manifest
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk-process case files with Nyay agents.")
+    parser.add_argument("inputs", nargs="+", help="Case files and/or directories to process.")
+    parser.add_argument("--agents", default=",".join(DEFAULT_AGENTS),
+                        help=f"Comma-separated agents ({', '.join(AGENT_REGISTRY)}).")
+    parser.add_argument("--language", default="English")
+    parser.add_argument("--output", default="batch_output", help="Output store directory.")
+    parser.add_argument("--workers", type=int, default=2, help="Documents processed in parallel.")
+    args = parser.parse_args(argv)
+
+    report = run_batch(
+        args.inputs,
+        agents=[a.strip() for a in args.agents.split(",") if a.strip()],
+        language=args.language,
+        output_dir=args.output,
+        workers=args.workers,
+    )
+    report.pop("results")
+    print(json.dumps(report, indent=2))
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,10 @@
+import hashlib
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 of the file contents — the stable key for a document across agents."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
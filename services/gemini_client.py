@@ -1,19 +1,77 @@
 
-from google import genai
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# One client per process: its HTTP connection pool (and TLS session) is reused
+# by every agent call instead of being rebuilt per request.
+_client = None
+_client_lock = threading.Lock()
+
 def get_gemini_client():
-    # Remove any default GOOGLE_API_KEY injected by the base image
-    if "GOOGLE_API_KEY" in os.environ:
-        del os.environ["GOOGLE_API_KEY"]
+    global _client
+    if _client is not None:
+        return _client
+
+    with _client_lock:
+        if _client is None:
+            # Imported here so that loading this module stays cheap on cold start.
+            from google import genai
+
+            # Remove any default GOOGLE_API_KEY injected by the base image
+            if "GOOGLE_API_KEY" in os.environ:
+                del os.environ["GOOGLE_API_KEY"]
+
+            # Ensure we use only our Gemini API key
+            api_key = os.getenv("GEMINI_API_KEY", "")
+            if not api_key:
+                raise ValueError(" GEMINI_API_KEY not found in environment variables.")
+
+            os.environ["GEMINI_API_KEY"] = api_key
+            _client = genai.Client(api_key=api_key)
+    return _client
+
+
+# ----------------------------------------------
+# 📤 Compact, de-duplicated uploads
+# ----------------------------------------------
+# Gemini keeps uploaded files for 48h; reuse a handle well within that window.
+UPLOAD_REUSE_SECONDS = int(os.getenv("UPLOAD_REUSE_SECONDS", "3600"))
+_uploads = {}
+_upload_locks = {}
+_upload_guard = threading.Lock()
+
+
+def _evict_expired_uploads(now: float) -> None:
+    """Drops stale handles and idle locks. Call with `_upload_guard` held."""
+    for key in [k for k, (ts, _) in _uploads.items() if now - ts >= UPLOAD_REUSE_SECONDS]:
+        del _uploads[key]
+    for key in [k for k, lock in _upload_locks.items() if k not in _uploads and not lock.locked()]:
+        del _upload_locks[key]
+
+
+def upload_file(client, file_path: str):
+    """
+    Uploads `file_path` to Gemini after shrinking it (see upload_optimizer).
+    All agents share one upload per document instead of re-sending the bytes.
+    """
+    from services.upload_optimizer import optimize_for_upload
 
-    # Ensure we use only our Gemini API key
-    api_key = os.getenv("GEMINI_API_KEY", "")
-    if not api_key:
-        raise ValueError(" GEMINI_API_KEY not found in environment variables.")
+    path = optimize_for_upload(file_path)
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime)
 
-    os.environ["GEMINI_API_KEY"] = api_key
-    return genai.Client(api_key=api_key)
+    with _upload_guard:
+        _evict_expired_uploads(time.time())
+        lock = _upload_locks.setdefault(key, threading.Lock())
+    with lock:
+        cached = _uploads.get(key)
+        if cached and time.time() - cached[0] < UPLOAD_REUSE_SECONDS:
+            return cached[1]
+        uploaded = client.files.upload(file=path)
+        with _upload_guard:
+            _uploads[key] = (time.time(), uploaded)
+        return uploaded
@@ -0,0 +1,534 @@
+"""
+Cross-document knowledge graph.
+
+Entities extracted from each document are resolved against everything seen
+before (normalized names, aliases and token blocking with fuzzy matching), so
+repeat parties, judges and police stations across related matters collapse into
+one node. Only new nodes/edges (or new case memberships) are written to the
+backend, and an in-process adjacency cache serves D3 JSON for a case or a
+neighbourhood without a round trip to Neo4j.
+
+Matching errs on the side of keeping entities apart: names whose numbers
+differ never merge, statutes and sections only match exactly, and people need
+the same surname plus the same first name — an initials-only match ('A Sharma')
+or a bare surname must be unambiguous and corroborated by a shared case or a
+specific role. Identical names only merge within one entity type.
+A failed backend write rolls the cache back and is re-raised.
+
+The backend is Neo4j when credentials are configured, otherwise an in-memory
+stand-in with the same interface (also handy for local runs and tests).
+"""
+import os
+import re
+import threading
+import unicodedata
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+NEO4J_URI = os.getenv("NEO4J_URI")
+NEO4J_USERNAME = os.getenv("NEO4J_USERNAME")
+NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
+NEO4J_DATABASE = os.getenv("NEO4J_DATABASE", "neo4j")
+
+# "memory" forces the in-process stand-in even when Neo4j credentials exist.
+GRAPH_BACKEND = os.getenv("GRAPH_BACKEND", "auto").lower()
+MATCH_THRESHOLD = float(os.getenv("GRAPH_MATCH_THRESHOLD", "0.88"))
+
+# Titles and honorifics that vary between orders but never identify a person.
+_HONORIFICS = {
+    "mr", "mrs", "ms", "smt", "shri", "sh", "sri", "shrimati", "kumari", "km",
+    "dr", "hon", "honble", "justice", "learned", "adv", "advocate", "sr",
+    "senior", "counsel", "ld", "m/s", "the",
+}
+# Common abbreviations in Indian orders, expanded before matching.
+_ABBREVIATIONS = {
+    "ps": "police station",
+    "thana": "police station",
+    "hc": "high court",
+    "sc": "supreme court",
+    "govt": "government",
+    "addl": "additional",
+    "asj": "additional sessions judge",
+}
+# Person-type labels use name rules (surname + first name or initials) instead
+# of string similarity; "person" itself says nothing about the role.
+_PERSON_LABELS = {
+    "person", "judge", "lawyer", "advocate", "counsel", "petitioner", "respondent",
+    "appellant", "accused", "complainant", "witness", "officer", "police officer",
+}
+_GENERIC_PERSON_LABELS = {"person"}
+# Statutes and provisions only ever match exactly.
+_STATUTE_LABELS = {
+    "section", "statute", "act", "law", "provision", "article", "rule", "citation", "legal section",
+}
+_STATUTE_RE = re.compile(r"\b(section|sec|article|art|rule|order|ipc|crpc|cpc|bns|bnss|act)\b")
+# Tokens too common to be useful for blocking.
+_STOP_TOKENS = {"of", "and", "the", "vs", "v", "for", "in", "at", "&"}
+
+Edge = Tuple[str, str, str]  # (source id, target id, relation)
+
+
+# ----------------------------------------------
+# 🔤 Name normalization & blocking
+# ----------------------------------------------
+def normalize_name(name: str) -> str:
+    """Lower-cases, strips accents, punctuation and honorifics, collapses spaces."""
+    text = unicodedata.normalize("NFKD", name or "")
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    text = re.sub(r"[^\w\s/']", " ", text).replace("'", "")
+    tokens = [_ABBREVIATIONS.get(t, t) for t in text.split() if t not in _HONORIFICS]
+    return " ".join(tokens)
+
+
+def blocking_keys(normalized: str) -> Set[str]:
+    """Token-prefix blocking keys: any candidate match must share at least one."""
+    return {t[:4] for t in normalized.split() if len(t) >= 3 and t not in _STOP_TOKENS}
+
+
+def _numbers(normalized: str) -> Set[str]:
+    """Tokens carrying digits: sector, FIR, case and section numbers, years."""
+    return {t for t in normalized.split() if any(c.isdigit() for c in t)}
+
+
+def is_statute(normalized: str, label: str = "") -> bool:
+    """Sections, Acts, Articles and rules: distinct whenever their text differs."""
+    return (label or "").strip().lower() in _STATUTE_LABELS or bool(_STATUTE_RE.search(normalized))
+
+
+def person_match(a: str, b: str) -> Optional[str]:
+    """
+    Compares two normalized person names. Returns "exact" when the surname and
+    the full first name agree ('ramesh sharma' vs 'ramesh kumar sharma'),
+    "initials" when they only agree up to initials ('a sharma' vs
+    'anil sharma'), and None when they conflict ('ramesh kumar' vs 'rakesh kumar').
+    """
+    ta, tb = a.split(), b.split()
+    if len(ta) < 2 or len(tb) < 2 or ta[-1] != tb[-1] or _numbers(a) != _numbers(b):
+        return None
+    initials = False
+    for x, y in zip(ta[:-1], tb[:-1]):
+        if x == y:
+            continue
+        if (len(x) == 1 or len(y) == 1) and x[0] == y[0]:
+            initials = True
+            continue
+        return None
+    if initials or len(ta[0]) == 1 or len(tb[0]) == 1:
+        return "initials"
+    return "exact"
+
+
+def name_similarity(a: str, b: str) -> float:
+    """Similarity of two normalized names in [0, 1]; 0 when their numbers differ."""
+    if a == b:
+        return 1.0
+    # 'Sector 5' / 'Sector 6' or 'CRM-M 12214' / '12215' are different things
+    # however alike the rest of the text is.
+    if _numbers(a) != _numbers(b):
+        return 0.0
+    ratio = SequenceMatcher(None, a, b).ratio()
+    sa, sb = set(a.split()), set(b.split())
+    jaccard = len(sa & sb) / len(sa | sb) if sa and sb else 0.0
+    return max(ratio, jaccard)
+
+
+def _label_key(label: str) -> str:
+    return (label or "").strip().lower()
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"\W+", "_", text).strip("_") or "entity"
+
+
+class EntityIndex:
+    """Resolves (name, label) mentions to canonical entity ids."""
+
+    def __init__(self, threshold: float = MATCH_THRESHOLD):
+        self.threshold = threshold
+        self.entities: Dict[str, Dict] = {}
+        self._by_norm: Dict[Tuple[str, str], str] = {}  # (label, normalized name) → id
+        self._blocks: Dict[str, Set[str]] = {}
+
+    def add(self, entity_id: str, name: str, label: str, aliases: Iterable[str] = (),
+            cases: Iterable[str] = ()) -> None:
+        entity = self.entities.setdefault(
+            entity_id, {"id": entity_id, "name": name, "label": label, "aliases": [], "cases": set()}
+        )
+        entity["cases"].update(c for c in cases if c)
+        for alias in [name, *aliases]:
+            if alias and alias not in entity["aliases"]:
+                entity["aliases"].append(alias)
+            norm = normalize_name(alias)
+            if not norm:
+                continue
+            self._by_norm.setdefault((_label_key(entity["label"]), norm), entity_id)
+            for key in blocking_keys(norm):
+                self._blocks.setdefault(key, set()).add(entity_id)
+
+    def _person_candidate(self, norm: str, entity: Dict) -> Optional[str]:
+        """Best person_match against an entity; None if any of its full names conflicts."""
+        kinds = []
+        for alias in entity["aliases"]:
+            alias_norm = normalize_name(alias)
+            if len(alias_norm.split()) < 2:
+                continue  # a bare surname neither confirms nor rules out a match
+            kind = person_match(norm, alias_norm)
+            if kind is None:
+                return None  # e.g. 'ajay sharma' vs an entity already known as 'anil sharma'
+            kinds.append(kind)
+        if not kinds:
+            return None
+        return "exact" if "exact" in kinds else "initials"
+
+    def _corroborated(self, entity_id: str, label_key: str, case_id: Optional[str]) -> bool:
+        """A weak person match counts only within a shared case or for a specific role."""
+        return case_id in self.entities[entity_id]["cases"] or label_key not in _GENERIC_PERSON_LABELS
+
+    def match(self, name: str, label: str, case_id: Optional[str] = None) -> Optional[str]:
+        """
+        Returns the id of an existing entity for this mention, if any.
+        `case_id` is the mention's case, used to corroborate initials-only matches.
+        """
+        norm = normalize_name(name)
+        if not norm:
+            return None
+        label_key = _label_key(label)
+        is_person = label_key in _PERSON_LABELS
+        single_token = len(norm.split()) < 2
+        # Exact names only merge within the same type; a bare surname is too
+        # weak on its own and goes through the person rules below.
+        exact = self._by_norm.get((label_key, norm))
+        if exact and not (is_person and single_token):
+            return exact
+        if is_statute(norm, label):
+            return None  # 'Section 420 IPC' and 'Section 406 IPC' must stay apart
+
+        candidates = set()
+        for key in blocking_keys(norm):
+            candidates |= self._blocks.get(key, set())
+        # Fuzzy matches only merge within the same entity type.
+        candidates = sorted(c for c in candidates if _label_key(self.entities[c]["label"]) == label_key)
+
+        if is_person and single_token:
+            # 'Sharma' alone: exactly one corroborated person with that surname may fit.
+            fits = [cid for cid in candidates
+                    if any(normalize_name(a).split()[-1:] == [norm] for a in self.entities[cid]["aliases"])
+                    and self._corroborated(cid, label_key, case_id)]
+            return fits[0] if len(fits) == 1 else None
+
+        if is_person:
+            by_kind = {"exact": [], "initials": []}
+            for cid in candidates:
+                kind = self._person_candidate(norm, self.entities[cid])
+                if kind:
+                    by_kind[kind].append(cid)
+            # More than one plausible person means we can't tell who is meant.
+            if by_kind["exact"]:
+                return by_kind["exact"][0] if len(by_kind["exact"]) == 1 else None
+            if len(by_kind["initials"]) == 1:
+                cid = by_kind["initials"][0]
+                return cid if self._corroborated(cid, label_key, case_id) else None
+            return None
+
+        best_id, best_score = None, 0.0
+        for cid in candidates:
+            score = max(name_similarity(norm, normalize_name(a)) for a in self.entities[cid]["aliases"])
+            if score > best_score:
+                best_id, best_score = cid, score
+        return best_id if best_score >= self.threshold else None
+
+    def resolve(self, name: str, label: str, case_id: Optional[str] = None) -> Tuple[str, bool]:
+        """Returns (canonical id, created) and records `name` as an alias."""
+        entity_id = self.match(name, label, case_id)
+        created = entity_id is None
+        if created:
+            base = f"{_slug((label or 'entity').lower())}:{_slug(normalize_name(name) or name.lower())}"
+            entity_id, n = base, 1
+            while entity_id in self.entities:
+                n += 1
+                entity_id = f"{base}_{n}"
+        self.add(entity_id, name, label, cases=[case_id] if case_id else ())
+        return entity_id, created
+
+
+# ----------------------------------------------
+# 🗄️ Backends
+# ----------------------------------------------
+class InMemoryGraphBackend:
+    """Local Neo4j stand-in: keeps nodes and edges in dicts."""
+
+    def __init__(self):
+        self.nodes: Dict[str, Dict] = {}
+        self.edges: Dict[Edge, Dict] = {}
+
+    def load(self) -> Tuple[List[Dict], List[Dict]]:
+        nodes = [dict(n, aliases=list(n["aliases"]), cases=list(n["cases"]))
+                 for n in self.nodes.values()]
+        edges = [{"source": s, "target": t, "relation": r, "cases": list(e["cases"])}
+                 for (s, t, r), e in self.edges.items()]
+        return nodes, edges
+
+    def write(self, nodes: List[Dict], edges: List[Dict]) -> None:
+        for node in nodes:
+            stored = self.nodes.setdefault(
+                node["id"], {"id": node["id"], "aliases": [], "cases": []}
+            )
+            stored.update(name=node["name"], label=node["label"])
+            stored["aliases"] = sorted(set(stored["aliases"]) | set(node["aliases"]))
+            stored["cases"] = sorted(set(stored["cases"]) | set(node["cases"]))
+        for edge in edges:
+            key = (edge["source"], edge["target"], edge["relation"])
+            stored = self.edges.setdefault(key, {"cases": []})
+            stored["cases"] = sorted(set(stored["cases"]) | set(edge["cases"]))
+
+    def reset(self) -> None:
+        self.nodes.clear()
+        self.edges.clear()
+
+    def close(self) -> None:
+        pass
+
+
+class Neo4jGraphBackend:
+    """Writes batched, idempotent MERGEs through one long-lived driver."""
+
+    def __init__(self, uri: str, username: str, password: str, database: str = "neo4j"):
+        from neo4j import GraphDatabase
+
+        self.database = database
+        self.driver = GraphDatabase.driver(uri=uri, auth=(username, password))
+
+    def load(self) -> Tuple[List[Dict], List[Dict]]:
+        with self.driver.session(database=self.database) as session:
+            nodes = [dict(r) for r in session.run(
+                "MATCH (n:Entity) RETURN n.id AS id, n.name AS name, n.label AS label, "
+                "coalesce(n.aliases, [n.name]) AS aliases, coalesce(n.cases, []) AS cases"
+            )]
+            edges = [dict(r) for r in session.run(
+                "MATCH (a:Entity)-[r:REL]->(b:Entity) RETURN a.id AS source, b.id AS target, "
+                "r.type AS relation, coalesce(r.cases, []) AS cases"
+            )]
+        return nodes, edges
+
+    def write(self, nodes: List[Dict], edges: List[Dict]) -> None:
+        with self.driver.session(database=self.database) as session:
+            session.execute_write(self._write_tx, nodes, edges)
+
+    @staticmethod
+    def _write_tx(tx, nodes: List[Dict], edges: List[Dict]) -> None:
+        if nodes:
+            tx.run(
+                "UNWIND $nodes AS node "
+                "MERGE (n:Entity {id: node.id}) "
+                "SET n.name = node.name, n.label = node.label, "
+                "    n.aliases = [a IN coalesce(n.aliases, []) WHERE NOT a IN node.aliases] + node.aliases, "
+                "    n.cases = [c IN coalesce(n.cases, []) WHERE NOT c IN node.cases] + node.cases",
+                nodes=nodes,
+            )
+        if edges:
+            tx.run(
+                "UNWIND $edges AS edge "
+                "MATCH (a:Entity {id: edge.source}), (b:Entity {id: edge.target}) "
+                "MERGE (a)-[r:REL {type: edge.relation}]->(b) "
+                "SET r.cases = [c IN coalesce(r.cases, []) WHERE NOT c IN edge.cases] + edge.cases",
+                edges=edges,
+            )
+
+    def reset(self) -> None:
+        with self.driver.session(database=self.database) as session:
+            session.run("MATCH (n) DETACH DELETE n")
+
+    def close(self) -> None:
+        self.driver.close()
+
+
+# ----------------------------------------------
+# 🧠 Knowledge graph + adjacency cache
+# ----------------------------------------------
+class KnowledgeGraph:
+    """Entity index + adjacency cache in front of a graph backend."""
+
+    def __init__(self, backend, threshold: float = MATCH_THRESHOLD):
+        self.backend = backend
+        self.index = EntityIndex(threshold)
+        self._lock = threading.RLock()
+        self._nodes: Dict[str, Dict] = {}
+        self._edges: Dict[Edge, Set[str]] = {}
+        self._adjacency: Dict[str, Set[Edge]] = {}
+        self._case_nodes: Dict[str, Set[str]] = {}
+        self._warm()
+
+    def _warm(self) -> None:
+        """Loads the existing graph once so later reads never hit the backend."""
+        nodes, edges = self.backend.load()
+        for node in nodes:
+            self.index.add(node["id"], node["name"], node["label"], node.get("aliases") or [],
+                           node.get("cases") or [])
+            self._cache_node(node["id"], node["name"], node["label"],
+                             node.get("cases") or [], node.get("aliases") or [])
+        for edge in edges:
+            self._cache_edge((edge["source"], edge["target"], edge["relation"]), edge.get("cases") or [])
+        if nodes:
+            print(f"🧠 Knowledge graph warmed: {len(nodes)} nodes, {len(edges)} edges.")
+
+    def _cache_node(self, node_id: str, name: str, label: str,
+                    cases: Iterable[str], aliases: Iterable[str] = ()) -> None:
+        node = self._nodes.setdefault(
+            node_id, {"id": node_id, "name": name, "label": label, "cases": set(), "aliases": set()}
+        )
+        node["cases"].update(cases)
+        node["aliases"].update(aliases)
+        for case_id in cases:
+            self._case_nodes.setdefault(case_id, set()).add(node_id)
+
+    def _cache_edge(self, key: Edge, cases: Iterable[str]) -> None:
+        self._edges.setdefault(key, set()).update(cases)
+        self._adjacency.setdefault(key[0], set()).add(key)
+        self._adjacency.setdefault(key[1], set()).add(key)
+
+    def has_case(self, case_id: str) -> bool:
+        return case_id in self._case_nodes
+
+    def merge_document(self, case_id: str, graph_data: Dict) -> Dict:
+        """
+        Resolves a document's {nodes, edges} against the graph, writes only what
+        is new and returns the case graph with canonical ids.
+        """
+        with self._lock:
+            local_to_canonical = {}
+            node_writes, edge_writes = {}, []
+
+            for node in graph_data.get("nodes", []):
+                name = str(node.get("name") or node.get("id") or "").strip()
+                label = str(node.get("label") or "Entity").strip()
+                if not name:
+                    continue
+                entity_id, created = self.index.resolve(name, label, case_id)
+                local_to_canonical[str(node.get("id", name))] = entity_id
+
+                cached = self._nodes.get(entity_id)
+                entity = self.index.entities[entity_id]
+                # Only touch the backend when this is a new entity, a new case
+                # membership or a new alias.
+                if created or not cached or case_id not in cached["cases"] or name not in cached["aliases"]:
+                    node_writes[entity_id] = {
+                        "id": entity_id,
+                        "name": entity["name"],
+                        "label": entity["label"],
+                        "aliases": [name],
+                        "cases": [case_id],
+                    }
+                self._cache_node(entity_id, entity["name"], entity["label"], [case_id], [name])
+
+            for edge in graph_data.get("edges", []):
+                source = local_to_canonical.get(str(edge.get("source")))
+                target = local_to_canonical.get(str(edge.get("target")))
+                relation = str(edge.get("relation") or "RELATED_TO").strip()
+                if not source or not target or source == target:
+                    continue
+                key = (source, target, relation)
+                if case_id not in self._edges.get(key, ()):
+                    edge_writes.append({"source": source, "target": target,
+                                        "relation": relation, "cases": [case_id]})
+                self._cache_edge(key, [case_id])
+
+            if node_writes or edge_writes:
+                try:
+                    self.backend.write(list(node_writes.values()), edge_writes)
+                except Exception as e:
+                    # The cache must never claim what the backend doesn't have.
+                    print(f"❌ Graph backend write failed, rolling back case {case_id[:12]}: {e}")
+                    self._reload()
+                    raise
+
+            print(f"🧩 Merged case {case_id[:12]}: {len(node_writes)} node write(s), "
+                  f"{len(edge_writes)} new edge(s).")
+            return self.case_graph(case_id)
+
+    def _to_d3(self, node_ids: Iterable[str], edge_keys: Iterable[Edge]) -> Dict:
+        nodes = [
+            {"id": nid, "label": self._nodes[nid]["label"], "name": self._nodes[nid]["name"],
+             "cases": len(self._nodes[nid]["cases"])}
+            for nid in sorted(node_ids)
+        ]
+        edges = [{"source": s, "target": t, "relation": r} for s, t, r in sorted(edge_keys)]
+        return {"nodes": nodes, "edges": edges}
+
+    def case_graph(self, case_id: str) -> Dict:
+        """D3 JSON of every node and edge seen in one case."""
+        with self._lock:
+            node_ids = self._case_nodes.get(case_id, set())
+            edge_keys = [k for k, cases in self._edges.items() if case_id in cases]
+            return self._to_d3(node_ids, edge_keys)
+
+    def neighbourhood(self, node_id: str, depth: int = 1) -> Dict:
+        """D3 JSON of everything within `depth` hops of `node_id`, across all cases."""
+        with self._lock:
+            if node_id not in self._nodes:
+                return {"nodes": [], "edges": []}
+            seen, frontier, edge_keys = {node_id}, {node_id}, set()
+            for _ in range(max(0, depth)):
+                nxt = set()
+                for nid in frontier:
+                    for key in self._adjacency.get(nid, ()):
+                        edge_keys.add(key)
+                        other = key[1] if key[0] == nid else key[0]
+                        if other not in seen:
+                            nxt.add(other)
+                seen |= nxt
+                frontier = nxt
+            return self._to_d3(seen, edge_keys)
+
+    def _clear(self) -> None:
+        self.index = EntityIndex(self.index.threshold)
+        self._nodes.clear()
+        self._edges.clear()
+        self._adjacency.clear()
+        self._case_nodes.clear()
+
+    def _reload(self) -> None:
+        """Rebuilds the index and caches from the backend (after a failed write)."""
+        self._clear()
+        try:
+            self._warm()
+        except Exception as e:
+            print(f"❌ Knowledge graph reload failed, cache left empty: {e}")
+
+    def reset(self) -> None:
+        """Drops all stored data (demo-mode rebuild)."""
+        with self._lock:
+            self.backend.reset()
+            self._clear()
+
+
+_graph: Optional[KnowledgeGraph] = None
+_graph_lock = threading.Lock()
+
+
+def _make_backend():
+    if GRAPH_BACKEND != "memory" and all([NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD]):
+        try:
+            return Neo4jGraphBackend(str(NEO4J_URI), str(NEO4J_USERNAME), str(NEO4J_PASSWORD), NEO4J_DATABASE)
+        except Exception as e:
+            print(f"❌ Neo4j unavailable, using in-memory graph: {e}")
+    else:
+        print("⚠️ Neo4j not configured — using in-memory knowledge graph.")
+    return InMemoryGraphBackend()
+
+
+def get_knowledge_graph() -> KnowledgeGraph:
+    """Process-wide knowledge graph, created on first use."""
+    global _graph
+    if _graph is None:
+        with _graph_lock:
+            if _graph is None:
+                try:
+                    _graph = KnowledgeGraph(_make_backend())
+                except Exception as e:
+                    print(f"❌ Knowledge graph warm-up failed, using in-memory graph: {e}")
+                    _graph = KnowledgeGraph(InMemoryGraphBackend())
+    return _graph
@@ -0,0 +1,478 @@
+"""
+Near-duplicate document detection and reuse of prior agent outputs.
+
+A re-scan, a certified copy with an extra stamp page or a DOCX export of an
+already analysed PDF has a different hash but almost the same text. Each
+document's extracted text is fingerprinted with MinHash over word shingles and
+indexed with LSH banding in a local SQLite file. When a new upload is close
+enough to an analysed document, the match is offered to the user (who can
+accept or decline it on the dashboard). In "reuse" mode stored outputs are
+served automatically, but only when the case number, parties, decision date
+and operative-order text of both documents agree — templated orders of
+different cases look alike to MinHash. Every decision goes to an audit table.
+
+Agents mark placeholder results with `FallbackOutput` (see agent_output); those
+are never stored.
+Stored outputs expire after NEAR_DUP_TTL_SECONDS and can be invalidated.
+
+Documents without a text layer (photos, image-only scans) fall back to exact
+content-hash matching.
+"""
+import functools
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from services.agent_output import is_placeholder
+from services.file_utils import file_digest
+
+# "offer" reports the match to the user, "reuse" also serves stored outputs
+# automatically when the documents' facts agree, "off" disables.
+NEAR_DUP_MODE = os.getenv("NEAR_DUP_MODE", "offer").lower()
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.8"))
+# Stored outputs older than this are neither reused nor offered (0 = keep forever).
+NEAR_DUP_TTL_SECONDS = int(os.getenv("NEAR_DUP_TTL_SECONDS", str(7 * 24 * 3600)))
+NEAR_DUP_DB = os.getenv("NEAR_DUP_DB", os.path.join("/tmp", "near_duplicates.sqlite3"))
+
+NUM_PERM = 128
+BANDS, ROWS = 32, 4  # BANDS * ROWS == NUM_PERM
+SHINGLE_WORDS = 5
+MIN_WORDS = 50  # below this, MinHash estimates are too noisy to trust
+
+_MERSENNE = np.uint64((1 << 61) - 1)
+_rng = np.random.RandomState(20240314)  # fixed: fingerprints must be stable across restarts
+_PERM_A = _rng.randint(1, 1 << 31, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, 1 << 31, size=NUM_PERM, dtype=np.uint64)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    sha256 TEXT PRIMARY KEY,
+    file TEXT,
+    words INTEGER,
+    signature BLOB,
+    created REAL,
+    facts TEXT
+);
+CREATE TABLE IF NOT EXISTS lsh_buckets (
+    band INTEGER,
+    bucket TEXT,
+    sha256 TEXT,
+    PRIMARY KEY (band, bucket, sha256)
+);
+CREATE TABLE IF NOT EXISTS agent_outputs (
+    sha256 TEXT,
+    agent TEXT,
+    language TEXT,
+    output TEXT,
+    created REAL,
+    PRIMARY KEY (sha256, agent, language)
+);
+CREATE TABLE IF NOT EXISTS reuse_audit (
+    ts REAL,
+    agent TEXT,
+    language TEXT,
+    file TEXT,
+    sha256 TEXT,
+    match_sha256 TEXT,
+    similarity REAL,
+    decision TEXT
+);
+"""
+
+_db_lock = threading.Lock()
+_conn: Optional[sqlite3.Connection] = None
+
+
+def _db() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(NEAR_DUP_DB, check_same_thread=False, timeout=30)
+        _conn.executescript(_SCHEMA)
+        try:
+            _conn.execute("ALTER TABLE documents ADD COLUMN facts TEXT")  # databases from before facts
+        except sqlite3.OperationalError:
+            pass
+        if NEAR_DUP_TTL_SECONDS:
+            _conn.execute("DELETE FROM agent_outputs WHERE created < ?", (time.time() - NEAR_DUP_TTL_SECONDS,))
+        _conn.commit()
+    return _conn
+
+
+def _fresh_since() -> float:
+    return time.time() - NEAR_DUP_TTL_SECONDS if NEAR_DUP_TTL_SECONDS else 0.0
+
+
+# ----------------------------------------------
+# 📄 Text extraction & fingerprints
+# ----------------------------------------------
+def extract_text(file_path: str) -> str:
+    """Plain text of a PDF, DOCX or text file; '' when there is no text layer."""
+    ext = os.path.splitext(file_path)[1].lower()
+    try:
+        if ext == ".pdf":
+            import fitz
+
+            with fitz.open(file_path) as doc:
+                return "\n".join(page.get_text("text") for page in doc)
+        if ext == ".docx":
+            import docx
+
+            return "\n".join(p.text for p in docx.Document(file_path).paragraphs)
+        if ext in (".txt", ".md"):
+            with open(file_path, encoding="utf-8", errors="ignore") as f:
+                return f.read()
+    except Exception as e:
+        print(f"⚠️ Text extraction failed for {os.path.basename(file_path)}: {e}")
+    return ""
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+def minhash_signature(words: List[str]) -> np.ndarray:
+    """128-value MinHash signature over SHINGLE_WORDS-word shingles."""
+    shingles = {
+        " ".join(words[i:i + SHINGLE_WORDS])
+        for i in range(max(1, len(words) - SHINGLE_WORDS + 1))
+    }
+    hashes = np.fromiter((zlib.crc32(s.encode()) for s in shingles), dtype=np.uint64, count=len(shingles))
+    # (a * x + b) mod p for every permutation at once: shape (NUM_PERM, len(shingles)).
+    permuted = (np.outer(_PERM_A, hashes) + _PERM_B[:, None]) % _MERSENNE
+    return (permuted.min(axis=1) & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+
+def estimated_similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.mean(a == b))
+
+
+def _band_buckets(signature: np.ndarray) -> List[str]:
+    return [signature[i * ROWS:(i + 1) * ROWS].tobytes().hex() for i in range(BANDS)]
+
+
+# ----------------------------------------------
+# ⚖️ Case facts (strict check before automatic reuse)
+# ----------------------------------------------
+_MONTHS = {m: i for i, m in enumerate(
+    ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"], 1)}
+_CASE_NO_RE = re.compile(
+    r"\b[A-Z][A-Za-z.()\-]*?[.\s-]*(?:No\.?\s*)?(\d{1,7})\s*(?:of|/|-)\s*((?:19|20)\d{2})\b")
+_NUMERIC_DATE_RE = re.compile(r"\b(\d{1,2})[./-](\d{1,2})[./-]((?:19|20)\d{2})\b")
+_WORD_DATE_RE = re.compile(
+    r"\b(\d{1,2})(?:st|nd|rd|th)?\s+(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?,?\s+((?:19|20)\d{2})\b",
+    re.IGNORECASE)
+_DECISION_MARKER_RE = re.compile(
+    r"(?:date of (?:decision|order|judgment|pronouncement)|decided on|pronounced on|dated)\W{0,5}", re.IGNORECASE)
+_PARTIES_RE = re.compile(r"^\s*(.{3,150}?)\s+(?:versus|vs\.?|v/s\.?|v\.)\s+(.{3,150}?)\s*$",
+                         re.IGNORECASE | re.MULTILINE)
+_OPERATIVE_RE = re.compile(
+    r"\b(allowed|dismissed|granted|rejected|disposed of|quashed|set aside|acquitted|convicted|"
+    r"released on bail|directed)\b", re.IGNORECASE)
+
+
+def _dates(text: str) -> List[tuple]:
+    """(position, 'YYYY-MM-DD') for every date in the text."""
+    found = []
+    for m in _NUMERIC_DATE_RE.finditer(text):
+        day, month, year = int(m.group(1)), int(m.group(2)), m.group(3)
+        if 1 <= day <= 31 and 1 <= month <= 12:
+            found.append((m.start(), f"{year}-{month:02d}-{day:02d}"))
+    for m in _WORD_DATE_RE.finditer(text):
+        found.append((m.start(), f"{m.group(3)}-{_MONTHS[m.group(2).lower()[:3]]:02d}-{int(m.group(1)):02d}"))
+    return sorted(found)
+
+
+def document_facts(text: str) -> Dict[str, List[str]]:
+    """
+    Case numbers, parties, decision date and operative-order sentences of a
+    judgment or order. Empty lists when a fact can't be found.
+    """
+    case_numbers = sorted({f"{n}/{y}" for n, y in _CASE_NO_RE.findall(text)})
+
+    parties = []
+    m = _PARTIES_RE.search(text)
+    if m:
+        parties = [" ".join(_words(m.group(1))), " ".join(_words(m.group(2)))]
+
+    dates = _dates(text)
+    decision_date = []
+    marker = _DECISION_MARKER_RE.search(text)
+    if marker:
+        decision_date = [d for pos, d in dates if marker.end() <= pos <= marker.end() + 40][:1]
+    if not decision_date and dates:
+        decision_date = [dates[0][1]]
+
+    sentences = re.split(r"(?<=[.;])\s+", text)
+    operative = [" ".join(_words(s)) for s in sentences if _OPERATIVE_RE.search(s)][-3:]
+
+    return {"case_numbers": case_numbers, "parties": parties,
+            "decision_date": decision_date, "operative": operative}
+
+
+def facts_match(a: Optional[Dict], b: Optional[Dict]) -> bool:
+    """True only when every fact was found in both documents and they agree."""
+    if not a or not b:
+        return False
+    return all(a.get(k) and a.get(k) == b.get(k)
+               for k in ("case_numbers", "parties", "decision_date", "operative"))
+
+
+# ----------------------------------------------
+# 🔎 Index
+# ----------------------------------------------
+def index_document(file_path: str) -> Dict:
+    """
+    Fingerprints `file_path` (once per content hash) and returns
+    {"sha256", "match_sha256", "similarity", "candidates", "facts"}, where
+    `candidates` lists every LSH candidate as (sha256, similarity), most
+    similar first, and `facts` are the document's `document_facts`.
+    """
+    sha = file_digest(file_path)
+    with _db_lock:
+        conn = _db()
+        row = conn.execute("SELECT signature, facts FROM documents WHERE sha256=?", (sha,)).fetchone()
+
+    if row is None:
+        text = extract_text(file_path)
+        words = _words(text)
+        signature = minhash_signature(words) if len(words) >= MIN_WORDS else None
+        facts = document_facts(text)
+        with _db_lock:
+            conn.execute(
+                "INSERT OR IGNORE INTO documents (sha256, file, words, signature, created, facts) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (sha, os.path.basename(file_path), len(words),
+                 signature.tobytes() if signature is not None else None, time.time(), json.dumps(facts)),
+            )
+            if signature is not None:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO lsh_buckets VALUES (?, ?, ?)",
+                    [(band, bucket, sha) for band, bucket in enumerate(_band_buckets(signature))],
+                )
+            conn.commit()
+    else:
+        signature = np.frombuffer(row[0], dtype=np.uint32) if row[0] else None
+        facts = json.loads(row[1]) if row[1] else None
+
+    match = {"sha256": sha, "match_sha256": None, "similarity": 0.0, "candidates": [], "facts": facts}
+    if signature is None:
+        return match
+
+    with _db_lock:
+        candidates = set()
+        for band, bucket in enumerate(_band_buckets(signature)):
+            candidates.update(r[0] for r in conn.execute(
+                "SELECT sha256 FROM lsh_buckets WHERE band=? AND bucket=? AND sha256!=?",
+                (band, bucket, sha),
+            ))
+        for cand in candidates:
+            cand_row = conn.execute("SELECT signature FROM documents WHERE sha256=?", (cand,)).fetchone()
+            sim = estimated_similarity(signature, np.frombuffer(cand_row[0], dtype=np.uint32))
+            match["candidates"].append((cand, round(sim, 3)))
+    match["candidates"].sort(key=lambda c: c[1], reverse=True)
+    if match["candidates"]:
+        match["match_sha256"], match["similarity"] = match["candidates"][0]
+    return match
+
+
+def _prior_output(match: Dict, agent: str, language: str, threshold: float):
+    """(sha256, similarity, output) of the most similar candidate that has `agent` output."""
+    for cand, sim in match["candidates"]:
+        if sim < threshold:
+            break
+        output = _stored_output(cand, agent, language)
+        if output is not None:
+            return cand, sim, output
+    return None
+
+
+def _stored_output(sha: str, agent: str, language: str) -> Optional[str]:
+    with _db_lock:
+        row = _db().execute(
+            "SELECT output FROM agent_outputs WHERE sha256=? AND agent=? AND language=? AND created >= ?",
+            (sha, agent, language, _fresh_since()),
+        ).fetchone()
+    return row[0] if row else None
+
+
+def _stored_facts(sha: str) -> Optional[Dict]:
+    with _db_lock:
+        row = _db().execute("SELECT facts FROM documents WHERE sha256=?", (sha,)).fetchone()
+    return json.loads(row[0]) if row and row[0] else None
+
+
+def _store_output(sha: str, agent: str, language: str, output: str) -> None:
+    with _db_lock:
+        conn = _db()
+        conn.execute(
+            "INSERT OR REPLACE INTO agent_outputs VALUES (?, ?, ?, ?, ?)",
+            (sha, agent, language, output, time.time()),
+        )
+        conn.commit()
+
+
+def invalidate_outputs(sha256: Optional[str] = None, agent: Optional[str] = None) -> int:
+    """Deletes stored outputs (all, one document's, and/or one agent's). Returns how many."""
+    clauses, params = [], []
+    if sha256:
+        clauses.append("sha256=?")
+        params.append(sha256)
+    if agent:
+        clauses.append("agent=?")
+        params.append(agent)
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    with _db_lock:
+        conn = _db()
+        deleted = conn.execute(f"DELETE FROM agent_outputs{where}", params).rowcount
+        conn.commit()
+    print(f"🧹 Invalidated {deleted} stored agent output(s).")
+    return deleted
+
+
+def _audit(agent: str, language: str, file_path: str, match: Dict, decision: str) -> None:
+    with _db_lock:
+        conn = _db()
+        conn.execute(
+            "INSERT INTO reuse_audit VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (time.time(), agent, language, os.path.basename(file_path), match["sha256"],
+             match["match_sha256"], match["similarity"], decision),
+        )
+        conn.commit()
+
+
+def find_duplicate(file_path: str, language: str = "English",
+                   threshold: float = NEAR_DUP_THRESHOLD) -> Optional[Dict]:
+    """
+    The closest analysed document above `threshold`, with the agents it has
+    (unexpired) outputs for and whether its case facts match this file's.
+    """
+    match = index_document(file_path)
+    best = None
+    with _db_lock:
+        conn = _db()
+        for cand, sim in match["candidates"]:
+            if sim < threshold:
+                break
+            agents = [r[0] for r in conn.execute(
+                "SELECT agent FROM agent_outputs WHERE sha256=? AND language=? AND created >= ?",
+                (cand, language, _fresh_since()),
+            )]
+            # Prefer the closest document that actually has something to reuse.
+            if best is None or (agents and not best["agents"]):
+                doc = conn.execute("SELECT file FROM documents WHERE sha256=?", (cand,)).fetchone()
+                best = {"sha256": match["sha256"], "match_sha256": cand, "similarity": sim,
+                        "file": doc[0] if doc else None, "agents": agents}
+            if best["agents"]:
+                break
+    if best:
+        best["facts_match"] = facts_match(match["facts"], _stored_facts(best["match_sha256"]))
+    return best
+
+
+def audit_offer(file_path: str, offer: Dict, language: str = "English") -> None:
+    """Records that `offer` (a `find_duplicate` result) was shown to the user."""
+    _audit(",".join(offer["agents"]), language, file_path,
+           {"sha256": offer["sha256"], "match_sha256": offer["match_sha256"],
+            "similarity": offer["similarity"]}, "offered")
+
+
+def accept_duplicate(file_path: str, match_sha256: str, language: str = "English") -> List[str]:
+    """
+    The user confirmed that `file_path` is the same document as `match_sha256`:
+    copies that document's stored outputs to this one, so agent calls that have
+    not run yet are served from them. Returns the agents copied.
+    """
+    match = index_document(file_path)
+    if match_sha256 not in {cand for cand, sim in match["candidates"] if sim >= NEAR_DUP_THRESHOLD}:
+        raise ValueError("Not a near-duplicate of this file.")
+    now = time.time()
+    with _db_lock:
+        conn = _db()
+        rows = conn.execute(
+            "SELECT agent, output FROM agent_outputs WHERE sha256=? AND language=? AND created >= ?",
+            (match_sha256, language, _fresh_since()),
+        ).fetchall()
+        # Outputs this file already has (ran fresh before the user answered) are kept.
+        conn.executemany(
+            "INSERT OR IGNORE INTO agent_outputs VALUES (?, ?, ?, ?, ?)",
+            [(match["sha256"], agent, language, output, now) for agent, output in rows],
+        )
+        conn.commit()
+    agents = [agent for agent, _ in rows]
+    sim = dict(match["candidates"])[match_sha256]
+    _audit(",".join(agents), language, file_path, dict(match, match_sha256=match_sha256, similarity=sim), "accepted")
+    return agents
+
+
+def decline_duplicate(file_path: str, match_sha256: str, language: str = "English") -> None:
+    match = index_document(file_path)
+    sim = dict(match["candidates"]).get(match_sha256, 0.0)
+    _audit("*", language, file_path, dict(match, match_sha256=match_sha256, similarity=sim), "declined")
+
+
+def recent_audit(limit: int = 50) -> List[Dict]:
+    with _db_lock:
+        rows = _db().execute(
+            "SELECT ts, agent, language, file, sha256, match_sha256, similarity, decision "
+            "FROM reuse_audit ORDER BY ts DESC LIMIT ?", (limit,),
+        ).fetchall()
+    keys = ["ts", "agent", "language", "file", "sha256", "match_sha256", "similarity", "decision"]
+    return [dict(zip(keys, r)) for r in rows]
+
+
+# ----------------------------------------------
+# ♻️ Agent wrapper
+# ----------------------------------------------
+def reusable(agent: str):
+    """
+    Decorates an agent `fn(file_path, language, ...)` so that its output is
+    stored per document and reused for exact uploads, or for near-duplicates
+    whose case facts match in "reuse" mode.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(file_path: str, language: str = "English", *args, **kwargs):
+            if NEAR_DUP_MODE == "off":
+                return fn(file_path, language, *args, **kwargs)
+
+            try:
+                match = index_document(file_path)
+                exact = _stored_output(match["sha256"], agent, language)
+                if exact is not None:
+                    _audit(agent, language, file_path, dict(match, match_sha256=match["sha256"], similarity=1.0), "exact")
+                    return exact
+                # In "offer" mode the user decides (see find_duplicate / accept_duplicate);
+                # only automatic decisions are audited here.
+                if NEAR_DUP_MODE == "reuse" and match["similarity"] >= NEAR_DUP_THRESHOLD:
+                    prior = _prior_output(match, agent, language, NEAR_DUP_THRESHOLD)
+                    if prior is not None:
+                        cand, sim, output = prior
+                        same = facts_match(match["facts"], _stored_facts(cand))
+                        decision = "reused" if same else "facts_differ"
+                        _audit(agent, language, file_path, dict(match, match_sha256=cand, similarity=sim), decision)
+                        if decision == "reused":
+                            print(f"♻️ {agent}: reused output of near-duplicate "
+                                  f"(similarity {sim}) for {os.path.basename(file_path)}")
+                            return output
+            except Exception as e:
+                print(f"⚠️ Near-duplicate lookup failed: {e}")
+                match = None
+
+            output = fn(file_path, language, *args, **kwargs)
+            # Don't persist failure placeholders.
+            if match and not is_placeholder(output):
+                try:
+                    _store_output(match["sha256"], agent, language, output)
+                except Exception as e:
+                    print(f"⚠️ Could not store {agent} output: {e}")
+            return output
+        return wrapper
+    return decorator
@@ -0,0 +1,182 @@
+"""
+Priority-aware agent scheduler.
+
+Gemini calls run on a small, fixed pool of worker threads (the same capacity
+as before), but queued calls are served by priority instead of arrival order:
+
+    INTERACTIVE  the panel the user is looking at, or a chat turn
+    FOREGROUND   glance, summary and jargons
+    BACKGROUND   speculative prefetch: timeline, graph, related cases, readiness
+    BULK         /api/batch jobs — only when nothing a user is waiting on is queued
+
+When the user opens a panel whose call is still queued, `promote()` moves it
+ahead of background work. `cancel_session()` drops a session's queued calls
+when the page is closed. Calls that are already running are never interrupted.
+
+Calls are queued under a key: the session id, or "<session id>:<page token>"
+for calls made by one dashboard page load, so closing (or reloading) a page
+only cancels that page's calls. Cancelling a bare session id covers all its pages.
+
+Worker threads start on first use, so the scheduler is safe to import in a
+preloading gunicorn master.
+"""
+import heapq
+import itertools
+import os
+import threading
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+INTERACTIVE, FOREGROUND, BACKGROUND, BULK = 0, 1, 2, 3
+PRIORITY_NAMES = {"interactive": INTERACTIVE, "foreground": FOREGROUND,
+                  "background": BACKGROUND, "bulk": BULK}
+
+AGENT_PRIORITY = {
+    "thinker": INTERACTIVE,
+    "summary": FOREGROUND,
+    "glance": FOREGROUND,
+    "jargons": FOREGROUND,
+    "timeline": BACKGROUND,
+    "graph": BACKGROUND,
+    "related": BACKGROUND,
+    "readiness": BACKGROUND,
+}
+
+# Concurrent Gemini calls per process.
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "2"))
+
+
+def parse_priority(value: Optional[str], agent: str) -> int:
+    """Maps an `X-Agent-Priority` header value to a priority, else the agent's default."""
+    if value and value.lower() in PRIORITY_NAMES:
+        return PRIORITY_NAMES[value.lower()]
+    return AGENT_PRIORITY.get(agent, BACKGROUND)
+
+
+class _Job:
+    __slots__ = ("fn", "args", "kwargs", "agent", "session_id", "priority", "future", "entry")
+
+    def __init__(self, fn, args, kwargs, agent, session_id, priority):
+        self.fn, self.args, self.kwargs = fn, args, kwargs
+        self.agent, self.session_id, self.priority = agent, session_id, priority
+        self.future = Future()
+        self.entry = None
+
+
+class AgentScheduler:
+    def __init__(self, workers: int = SCHEDULER_WORKERS):
+        self.workers = max(1, workers)
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._queued = {}  # session_id → set of queued jobs
+
+    def _ensure_workers(self) -> None:
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"agent-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _push(self, job: _Job) -> None:
+        # Entries are [priority, seq, job]; re-prioritising blanks the old entry.
+        job.entry = [job.priority, next(self._seq), job]
+        heapq.heappush(self._heap, job.entry)
+
+    def _pop(self) -> Optional[_Job]:
+        while self._heap:
+            job = heapq.heappop(self._heap)[2]
+            if job is not None:
+                queued = self._queued.get(job.session_id)
+                if queued is not None:
+                    queued.discard(job)
+                    if not queued:
+                        del self._queued[job.session_id]  # finished batch / page keys would pile up
+                return job
+        return None
+
+    def submit(self, fn: Callable, *args, agent: str = "", session_id: str = "",
+               priority: Optional[int] = None, **kwargs) -> Future:
+        if priority is None:
+            priority = AGENT_PRIORITY.get(agent, BACKGROUND)
+        job = _Job(fn, args, kwargs, agent, session_id, priority)
+        with self._cond:
+            self._ensure_workers()
+            self._push(job)
+            self._queued.setdefault(session_id, set()).add(job)
+            self._cond.notify()
+        return job.future
+
+    def run(self, fn: Callable, *args, agent: str = "", session_id: str = "",
+            priority: Optional[int] = None, **kwargs):
+        """Submits and waits. Raises CancelledError if the session ended first."""
+        return self.submit(fn, *args, agent=agent, session_id=session_id,
+                           priority=priority, **kwargs).result()
+
+    def promote(self, session_id: str, agent: str, priority: int = INTERACTIVE) -> int:
+        """Moves a session's queued calls for `agent` up to `priority`. Returns how many moved."""
+        moved = 0
+        with self._cond:
+            for job in self._queued.get(session_id, ()):
+                if job.agent == agent and job.priority > priority:
+                    job.entry[2] = None
+                    job.priority = priority
+                    self._push(job)
+                    moved += 1
+        return moved
+
+    def cancel_session(self, session_id: str, min_priority: int = INTERACTIVE) -> int:
+        """
+        Cancels queued calls at `min_priority` or lower for `session_id`, and for
+        every page of it when `session_id` is a bare session id. Returns how many.
+        """
+        cancelled = 0
+        with self._cond:
+            keys = [k for k in self._queued if k == session_id or k.startswith(session_id + ":")]
+            for key in keys:
+                for job in list(self._queued[key]):
+                    if job.priority >= min_priority and job.future.cancel():
+                        job.entry[2] = None
+                        self._queued[key].discard(job)
+                        cancelled += 1
+                if not self._queued[key]:
+                    self._queued.pop(key, None)
+        if cancelled:
+            print(f"🛑 Cancelled {cancelled} queued agent call(s) for session {session_id[:8]}.")
+        return cancelled
+
+    def stats(self) -> dict:
+        with self._cond:
+            queued = [entry[2] for entry in self._heap if entry[2] is not None]
+        by_priority = {name: sum(1 for j in queued if j.priority == p) for name, p in PRIORITY_NAMES.items()}
+        return {"workers": self.workers, "queued": by_priority}
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                job = self._pop()
+                while job is None:
+                    self._cond.wait()
+                    job = self._pop()
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            try:
+                job.future.set_result(job.fn(*job.args, **job.kwargs))
+            except BaseException as e:
+                job.future.set_exception(e)
+
+
+_scheduler: Optional[AgentScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> AgentScheduler:
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = AgentScheduler()
+    return _scheduler
+
@@ -0,0 +1,208 @@
+"""
+Shrinks case files before they are uploaded to Gemini.
+
+Phone photos and 300–600 DPI scans are downscaled to a target DPI, recompressed
+as JPEG (grayscale when the page has no colour), stripped of metadata, and
+blank scanned pages are dropped. PDFs come out as a compact PDF; images as a
+single JPEG. Results are cached on disk by content hash + settings, so every
+agent that uploads the same document reuses one optimized copy.
+
+Text/vector PDF pages are copied untouched — they are already small and keep
+their text layer. Scanned pages that carry an OCR text layer are kept as well;
+only their images are downscaled and recompressed in place.
+"""
+import hashlib
+import io
+import os
+import shutil
+import threading
+
+import fitz  # PyMuPDF
+from PIL import Image, ImageOps
+
+from services.file_utils import file_digest
+
+UPLOAD_OPTIMIZE = os.getenv("UPLOAD_OPTIMIZE", "true").lower() != "false"
+TARGET_DPI = int(os.getenv("UPLOAD_TARGET_DPI", "150"))
+JPEG_QUALITY = int(os.getenv("UPLOAD_JPEG_QUALITY", "60"))
+OPTIMIZED_DIR = os.getenv("UPLOAD_CACHE_DIR", os.path.join("/tmp", "optimized"))
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tif", ".tiff"}
+A4_LONG_SIDE_IN = 11.69
+# A page counts as scanned when images cover at least this share of it.
+SCANNED_COVERAGE = 0.5
+# A scanned page with fewer "ink" pixels than this fraction is treated as blank.
+BLANK_INK_RATIO = 0.002
+INK_LEVEL = 160  # grey levels below this count as ink
+# Keep the original unless the optimized copy is at least this much smaller.
+MIN_SAVING = 0.9
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _lock_for(key: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(key, threading.Lock())
+
+
+def _is_grayscale(img: Image.Image) -> bool:
+    """True when the image has (almost) no colour — typical for court orders."""
+    if img.mode in ("1", "L", "LA"):
+        return True
+    small = img.convert("RGB").resize((64, 64))
+    spread = sum(max(px) - min(px) for px in small.getdata()) / (64 * 64)
+    return spread < 12
+
+
+def _is_blank(img: Image.Image) -> bool:
+    # Count at full resolution: downsampling first would wash thin print out to grey.
+    gray = img.convert("L")
+    ink = sum(gray.histogram()[:INK_LEVEL])
+    return ink / max(1, gray.width * gray.height) < BLANK_INK_RATIO
+
+
+def _encode_jpeg(img: Image.Image, quality: int) -> bytes:
+    img = img.convert("L" if _is_grayscale(img) else "RGB")
+    buf = io.BytesIO()
+    # No exif/icc arguments → metadata is not carried over.
+    img.save(buf, format="JPEG", quality=quality, optimize=True, progressive=True)
+    return buf.getvalue()
+
+
+def _optimize_image(src: str, dst: str, dpi: int, quality: int) -> None:
+    with Image.open(src) as img:
+        img = ImageOps.exif_transpose(img)  # bake in phone rotation before EXIF is dropped
+        if img.mode in ("RGBA", "LA", "P"):
+            # Flatten transparency onto white paper instead of JPEG's implicit black.
+            rgba = img.convert("RGBA")
+            img = Image.new("RGB", rgba.size, "white")
+            img.paste(rgba, mask=rgba.getchannel("A"))
+        max_side = int(A4_LONG_SIDE_IN * dpi)
+        if max(img.size) > max_side:
+            img.thumbnail((max_side, max_side), Image.LANCZOS)
+        data = _encode_jpeg(img, quality)
+    with open(dst, "wb") as f:
+        f.write(data)
+
+
+def _page_image_coverage(page) -> float:
+    area = abs(page.rect) or 1.0
+    covered = 0.0
+    for info in page.get_images(full=True):
+        for rect in page.get_image_rects(info[0]):
+            covered += abs(rect & page.rect)
+    return min(1.0, covered / area)
+
+
+def _shrink_page_images(doc, page, dpi: int, quality: int, done: set) -> int:
+    """
+    Downscales and recompresses a page's images in place, leaving everything
+    else — in particular an OCR text layer — as it is. Returns how many changed.
+    """
+    changed = 0
+    for info in page.get_images(full=True):
+        xref, smask = info[0], info[1]
+        if xref in done or smask:
+            continue  # already handled, or has transparency JPEG can't keep
+        done.add(xref)
+        rects = page.get_image_rects(xref)
+        if not rects:
+            continue
+        shown_in = max(max(r.width, r.height) for r in rects) / 72
+        pix = fitz.Pixmap(doc, xref)
+        if pix.alpha or max(pix.width, pix.height) <= shown_in * dpi * 1.1:
+            continue  # already at (or below) the target resolution
+        if pix.n > 3:
+            pix = fitz.Pixmap(fitz.csRGB, pix)
+        img = Image.frombytes("L" if pix.n == 1 else "RGB", (pix.width, pix.height), pix.samples)
+        img.thumbnail((int(shown_in * dpi), int(shown_in * dpi)), Image.LANCZOS)
+        page.replace_image(xref, stream=_encode_jpeg(img, quality))
+        changed += 1
+    return changed
+
+
+def _optimize_pdf(src: str, dst: str, dpi: int, quality: int) -> dict:
+    stats = {"pages": 0, "rasterized": 0, "recompressed": 0, "dropped": 0}
+    shrunk = set()
+    with fitz.open(src) as doc, fitz.open() as out:
+        for page in doc:
+            stats["pages"] += 1
+            has_text = bool(page.get_text("text").strip())
+
+            if _page_image_coverage(page) < SCANNED_COVERAGE:
+                if not has_text and not page.get_images() and not page.get_drawings():
+                    stats["dropped"] += 1
+                    continue
+                out.insert_pdf(doc, from_page=page.number, to_page=page.number)
+                continue
+
+            if has_text:
+                # Scanned but OCR'd: rasterizing would throw the text layer
+                # away, so keep the page and shrink only its images.
+                out.insert_pdf(doc, from_page=page.number, to_page=page.number)
+                stats["recompressed"] += _shrink_page_images(out, out[-1], dpi, quality, shrunk)
+                continue
+
+            pix = page.get_pixmap(dpi=dpi, alpha=False)
+            img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+            if _is_blank(img):
+                stats["dropped"] += 1
+                continue
+            new_page = out.new_page(width=page.rect.width, height=page.rect.height)
+            new_page.insert_image(new_page.rect, stream=_encode_jpeg(img, quality))
+            stats["rasterized"] += 1
+
+        if out.page_count == 0:
+            raise ValueError("every page looked blank")
+        out.set_metadata({})
+        out.del_xml_metadata()
+        out.save(dst, garbage=4, deflate=True, clean=True)
+    return stats
+
+
+def optimize_for_upload(file_path: str, dpi: int = TARGET_DPI, quality: int = JPEG_QUALITY) -> str:
+    """
+    Returns the path of a compact copy of `file_path` for uploading, or the
+    original path when the file type is unsupported or nothing was gained.
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    if not UPLOAD_OPTIMIZE or (ext != ".pdf" and ext not in IMAGE_EXTENSIONS):
+        return file_path
+
+    os.makedirs(OPTIMIZED_DIR, exist_ok=True)
+    settings = hashlib.sha1(f"{dpi}:{quality}".encode()).hexdigest()[:8]
+    key = f"{file_digest(file_path)[:32]}-{settings}"
+    out_ext = ".pdf" if ext == ".pdf" else ".jpg"
+    cached = os.path.join(OPTIMIZED_DIR, key + out_ext)
+    passthrough = os.path.join(OPTIMIZED_DIR, key + ".keep")  # "optimizing didn't help"
+
+    with _lock_for(key):
+        if os.path.exists(cached):
+            return cached
+        if os.path.exists(passthrough):
+            return file_path
+
+        tmp = cached + ".tmp"
+        try:
+            if ext == ".pdf":
+                stats = _optimize_pdf(file_path, tmp, dpi, quality)
+            else:
+                _optimize_image(file_path, tmp, dpi, quality)
+                stats = {}
+        except Exception as e:
+            print(f"⚠️ Upload optimization skipped for {os.path.basename(file_path)}: {e}")
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return file_path
+
+        before, after = os.path.getsize(file_path), os.path.getsize(tmp)
+        if after >= before * MIN_SAVING:
+            os.remove(tmp)
+            open(passthrough, "w").close()
+            return file_path
+
+        shutil.move(tmp, cached)
+        print(f"🗜️ {os.path.basename(file_path)}: {before / 1024:.0f} KB → {after / 1024:.0f} KB "
+              f"({before / after:.1f}x smaller) {stats}")
+        return cached
@@ -0,0 +1,85 @@
+"""
+Cold-start helpers.
+
+Startup is split in two so it stays fork-safe under `gunicorn --preload`:
+
+* `preload_modules()` only imports code (agents, google-genai, neo4j, PyMuPDF,
+  Pillow, numpy). It runs once in the gunicorn master so workers share those pages.
+* `warm_clients()` creates the pooled Gemini client and the Neo4j-backed
+  knowledge graph. Sockets and driver threads must not cross a fork, so this
+  runs in each worker after fork, in a background thread, so `/healthz`
+  answers straight away.
+
+Timings are collected in `STARTUP_TIMINGS` and served by `/startupz`.
+"""
+import importlib
+import os
+import threading
+import time
+
+from services.batch_runner import AGENT_REGISTRY
+
+HEAVY_MODULES = [
+    "google.genai",
+    "neo4j",
+    "fitz",
+    "PIL.Image",
+    "numpy",
+    *sorted({module for module, _ in AGENT_REGISTRY.values()}),
+    "agents.thinker_agent",
+]
+
+# Opening the TLS connection to Gemini costs one tiny metadata request.
+WARMUP_NETWORK = os.getenv("WARMUP_NETWORK", "true").lower() != "false"
+
+STARTUP_TIMINGS = {"pid": os.getpid(), "modules": {}, "clients": {}, "ready": False}
+_PROCESS_START = time.perf_counter()
+_warm_lock = threading.Lock()
+
+
+def _timed(bucket: str, name: str, fn):
+    started = time.perf_counter()
+    try:
+        result = fn()
+        STARTUP_TIMINGS[bucket][name] = round(time.perf_counter() - started, 3)
+        return result
+    except Exception as e:
+        STARTUP_TIMINGS[bucket][name] = f"failed: {e}"
+        print(f"⚠️ Warm-up step '{name}' failed: {e}")
+        return None
+
+
+def preload_modules() -> None:
+    """Imports every heavy module. Safe to call before fork."""
+    for module in HEAVY_MODULES:
+        _timed("modules", module, lambda m=module: importlib.import_module(m))
+    STARTUP_TIMINGS["preload_s"] = round(time.perf_counter() - _PROCESS_START, 3)
+
+
+def warm_clients() -> None:
+    """Creates the pooled clients for this process. Call after fork."""
+    if not _warm_lock.acquire(blocking=False):
+        return  # already warming in this process
+    try:
+        started = time.perf_counter()
+        STARTUP_TIMINGS["pid"] = os.getpid()
+
+        from services.gemini_client import get_gemini_client
+        from services.knowledge_graph import get_knowledge_graph
+
+        client = _timed("clients", "gemini_client", get_gemini_client)
+        if client is not None and WARMUP_NETWORK:
+            _timed("clients", "gemini_tls", lambda: client.models.get(model="gemini-2.5-flash"))
+        _timed("clients", "knowledge_graph", get_knowledge_graph)
+
+        STARTUP_TIMINGS["warm_s"] = round(time.perf_counter() - started, 3)
+        STARTUP_TIMINGS["ready"] = True
+        print(f"🔥 Warm-up done in {STARTUP_TIMINGS['warm_s']}s: {STARTUP_TIMINGS['clients']}")
+    finally:
+        _warm_lock.release()
+
+
+def warm_clients_in_background() -> threading.Thread:
+    thread = threading.Thread(target=warm_clients, name="warmup", daemon=True)
+    thread.start()
+    return thread
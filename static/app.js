@@ -9,9 +9,24 @@ document.querySelectorAll(".sidebar li").forEach((item) => {
     const target = item.getAttribute("data-panel");
     document.querySelectorAll(".panel").forEach((p) => p.classList.remove("active"));
     document.getElementById(target).classList.add("active");
+
+    // ⏱️ If this panel's agent call is still queued, move it ahead of background work.
+    fetch("/api/scheduler/promote", {
+      method: "POST",
+      headers: { "Content-Type": "application/json", "X-Page-Token": PAGE_TOKEN },
+      body: JSON.stringify({ panel: target }),
+    }).catch(() => {});
   });
 });
 
+// 🛑 Leaving the dashboard: drop this page's queued (not yet running) agent calls.
+window.addEventListener("pagehide", () => {
+  navigator.sendBeacon(
+    "/api/session/end",
+    new Blob([JSON.stringify({ page: PAGE_TOKEN })], { type: "application/json" })
+  );
+});
+
 // ----------------------------------------------
 // 🧩 1️⃣ MARKDOWN RENDERING HELPERS
 // ----------------------------------------------
@@ -92,7 +107,11 @@ async function sendMessage() {
   try {
     const res = await fetch("/api/thinker_chat", {
       method: "POST",
-      headers: { "Content-Type": "application/json" },
+      headers: {
+        "Content-Type": "application/json",
+        "X-Agent-Priority": "interactive",
+        "X-Page-Token": PAGE_TOKEN,
+      },
       body: JSON.stringify({ history: [...history, { role: "user", content: text }] }),
     });
 
@@ -137,8 +156,7 @@ document.addEventListener("DOMContentLoaded", async () => {
   `;
 
   try {
-    const res = await fetch("/api/graph", {
-      method: "POST",
+    const res = await agentFetch("/api/graph", "graph", {
       headers: { "Content-Type": "application/json" },
       body: JSON.stringify({})
     });
@@ -0,0 +1,38 @@
+from services import batch_runner
+from services.agent_output import FallbackOutput
+from services.batch_runner import OutputStore, document_key, run_batch
+
+
+def test_resume_skips_done_pairs_and_retries_failures(tmp_path, monkeypatch):
+    monkeypatch.setitem(batch_runner.AGENT_REGISTRY, "summary", ("os.path", "basename"))
+    monkeypatch.setitem(batch_runner.AGENT_REGISTRY, "glance", ("os.path", "basename"))
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    for name in ("a.txt", "b.txt"):
+        (docs / name).write_text(f"order {name}")
+    output_dir = str(tmp_path / "out")
+
+    calls, outage = [], {"glance"}
+
+    def call(agent, fn, path, language):
+        calls.append((agent, fn(path)))
+        if agent in outage:
+            if fn(path) == "a.txt":
+                raise ConnectionError("Gemini unavailable")
+            return FallbackOutput("No summary generated.")  # placeholder, not a result
+        return f"{agent} of {fn(path)}"
+
+    first = run_batch([str(docs)], agents=["summary", "glance"], output_dir=output_dir, call=call)
+    assert first["failed"] == 2 and len(calls) == 4
+
+    calls.clear()
+    outage.clear()
+    second = run_batch([str(docs)], agents=["summary", "glance"], output_dir=output_dir, call=call)
+    assert sorted(calls) == [("glance", "a.txt"), ("glance", "b.txt")]
+    assert second["failed"] == 0 and second["skipped"] == 2
+
+    store = OutputStore(output_dir)
+    for name in ("a.txt", "b.txt"):
+        record = store.load(document_key(str(docs / name), "English"))
+        assert record["outputs"] == {"summary": f"summary of {name}", "glance": f"glance of {name}"}
+        assert record["errors"] == {}
@@ -0,0 +1,114 @@
+import pytest
+
+from services.knowledge_graph import EntityIndex, InMemoryGraphBackend, KnowledgeGraph
+
+
+def _merge(graph, case_id, *nodes):
+    data = {"nodes": [{"id": f"n{i}", "label": label, "name": name}
+                      for i, (name, label) in enumerate(nodes)], "edges": []}
+    return graph.merge_document(case_id, data)
+
+
+@pytest.fixture
+def graph():
+    return KnowledgeGraph(InMemoryGraphBackend())
+
+
+@pytest.mark.parametrize("first, second, label, second_label, second_case", [
+    ("Police Station Sector 5", "PS Sector 6", "Police", "Police", "case-a"),
+    ("Ramesh Kumar", "Rakesh Kumar", "Person", "Person", "case-a"),
+    ("Section 420 IPC", "Section 406 IPC", "Section", "Section", "case-a"),
+    ("Section 420 IPC", "Section 406 IPC", "Law", "Law", "case-a"),
+    ("CRM-M 12214 2024", "CRM-M 12215 2024", "Case", "Case", "case-a"),
+    # A bare surname in an unrelated case is not the same person.
+    ("Sharma", "Sharma", "Person", "Person", "case-b"),
+    # The same name with another type is another entity.
+    ("Ramesh Kumar", "Ramesh Kumar", "Accused", "Witness", "case-b"),
+])
+def test_distinct_entities_stay_apart(first, second, label, second_label, second_case):
+    index = EntityIndex()
+    first_id, _ = index.resolve(first, label, "case-a")
+    second_id, created = index.resolve(second, second_label, second_case)
+    assert created and first_id != second_id
+
+
+def test_bare_surname_merges_only_within_its_case():
+    index = EntityIndex()
+    first_id, _ = index.resolve("Sharma", "Person", "case-a")
+    index.resolve("Sharma", "Person", "case-b")
+    assert index.resolve("Sharma", "Person", "case-a") == (first_id, False)
+
+
+def test_spelling_variants_still_merge():
+    index = EntityIndex()
+    ps_id, _ = index.resolve("Police Station Sector 5", "Police", "case-a")
+    assert index.resolve("Sector-5 Police Station", "Police", "case-b") == (ps_id, False)
+    person_id, _ = index.resolve("Shri Ramesh Kumar Sharma", "Person", "case-a")
+    assert index.resolve("Ramesh Sharma", "Person", "case-b") == (person_id, False)
+
+
+def test_initials_need_corroboration():
+    index = EntityIndex()
+    short_id, _ = index.resolve("A. Sharma", "Person", "case-a")
+    # Different case, generic label: no evidence that A. Sharma is Anil Sharma.
+    assert index.resolve("Anil Sharma", "Person", "case-b")[1] is True
+    # Same case: corroborated.
+    index = EntityIndex()
+    short_id, _ = index.resolve("A. Sharma", "Person", "case-a")
+    assert index.resolve("Anil Sharma", "Person", "case-a") == (short_id, False)
+    # A specific role corroborates too.
+    judge_id, _ = index.resolve("A. Sharma", "Judge", "case-a")
+    assert index.resolve("Justice Anil Sharma", "Judge", "case-b") == (judge_id, False)
+
+
+def test_initials_do_not_collapse_first_come():
+    index = EntityIndex()
+    short_id, _ = index.resolve("A Sharma", "Judge", "case-a")
+    anil_id, _ = index.resolve("Anil Sharma", "Judge", "case-b")
+    ajay_id, created = index.resolve("Ajay Sharma", "Judge", "case-c")
+    assert anil_id == short_id
+    assert created and ajay_id != short_id
+
+
+def test_ambiguous_initials_do_not_merge():
+    index = EntityIndex()
+    anil_id, _ = index.resolve("Anil Sharma", "Person", "case-a")
+    ajay_id, _ = index.resolve("Ajay Sharma", "Person", "case-a")
+    short_id, created = index.resolve("A Sharma", "Person", "case-a")
+    assert created and short_id not in (anil_id, ajay_id)
+
+
+def test_cross_case_merge_and_cached_reads(graph):
+    _merge(graph, "case-a", ("Justice R. K. Verma", "Judge"), ("Police Station Sector 5", "Police"))
+    second = _merge(graph, "case-b", ("Hon'ble Mr. Justice R K Verma", "Judge"))
+    judge_id = second["nodes"][0]["id"]
+    assert second["nodes"][0]["cases"] == 2
+    assert graph.has_case("case-a") and graph.has_case("case-b")
+    assert judge_id in {n["id"] for n in graph.case_graph("case-a")["nodes"]}
+
+
+class _FailingBackend(InMemoryGraphBackend):
+    fail = False
+
+    def write(self, nodes, edges):
+        if self.fail:
+            raise ConnectionError("backend down")
+        super().write(nodes, edges)
+
+
+def test_failed_write_leaves_cache_untouched():
+    backend = _FailingBackend()
+    graph = KnowledgeGraph(backend)
+    _merge(graph, "case-a", ("Anil Sharma", "Judge"))
+
+    backend.fail = True
+    with pytest.raises(ConnectionError):
+        _merge(graph, "case-b", ("Anil Sharma", "Judge"), ("Police Station Sector 5", "Police"))
+    assert not graph.has_case("case-b")
+    assert graph.has_case("case-a")
+    assert [n["name"] for n in graph.case_graph("case-a")["nodes"]] == ["Anil Sharma"]
+
+    backend.fail = False
+    merged = _merge(graph, "case-b", ("Anil Sharma", "Judge"), ("Police Station Sector 5", "Police"))
+    assert graph.has_case("case-b") and len(merged["nodes"]) == 2
+    assert sorted(backend.nodes) == sorted(n["id"] for n in merged["nodes"])
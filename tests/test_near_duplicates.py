@@ -0,0 +1,95 @@
+import pytest
+
+from services import near_duplicates as nd
+from services.agent_output import FallbackOutput
+
+BODY = " ".join(f"The court considered paragraph {i} of the submissions made by counsel." for i in range(40))
+ORDER = f"""IN THE HIGH COURT OF PUNJAB AND HARYANA
+CRM-M-12214-2024
+Date of decision: 12.03.2024
+Ramesh Kumar
+versus
+State of Punjab
+{BODY}
+Considering the custody, the petition is allowed. The petitioner is released on bail."""
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(nd, "NEAR_DUP_DB", str(tmp_path / "nd.sqlite3"))
+    monkeypatch.setattr(nd, "_conn", None)
+    monkeypatch.setattr(nd, "NEAR_DUP_MODE", "reuse")
+
+    def write(name, text):
+        path = tmp_path / name
+        path.write_text(text)
+        return str(path)
+    return write
+
+
+def _agent(calls):
+    @nd.reusable("summary")
+    def summarize(path, language="English"):
+        calls.append(path)
+        return f"summary of {path}"
+    return summarize
+
+
+def test_other_case_on_same_template_is_not_reused(store):
+    calls = []
+    summarize = _agent(calls)
+    original = store("a.txt", ORDER)
+    other = store("b.txt", ORDER.replace("12214", "12215").replace("Ramesh", "Rakesh"))
+    summarize(original)
+    assert summarize(other) == f"summary of {other}"
+    assert [r["decision"] for r in nd.recent_audit(1)] == ["facts_differ"]
+
+
+def test_certified_copy_is_reused_in_reuse_mode(store):
+    calls = []
+    summarize = _agent(calls)
+    original = store("a.txt", ORDER)
+    copy = store("c.txt", ORDER + "\nCertified true copy issued on 15th April 2024.")
+    summarize(original)
+    assert summarize(copy) == f"summary of {original}"
+    assert calls == [original]
+
+
+def test_fallback_output_is_never_stored(store):
+    @nd.reusable("timeline")
+    def timeline(path, language="English"):
+        return FallbackOutput("[]")
+
+    path = store("a.txt", ORDER)
+    assert timeline(path) == "[]"
+    assert nd._stored_output(nd.file_digest(path), "timeline", "English") is None
+
+
+def test_expired_and_invalidated_outputs_are_not_served(store, monkeypatch):
+    summarize = _agent([])
+    path = store("a.txt", ORDER)
+    summarize(path)
+    sha = nd.file_digest(path)
+    assert nd._stored_output(sha, "summary", "English")
+    monkeypatch.setattr(nd, "NEAR_DUP_TTL_SECONDS", -1)
+    assert nd._stored_output(sha, "summary", "English") is None
+    monkeypatch.setattr(nd, "NEAR_DUP_TTL_SECONDS", 0)
+    assert nd.invalidate_outputs(sha) == 1
+    assert nd._stored_output(sha, "summary", "English") is None
+
+
+def test_offer_mode_audits_only_what_the_user_saw(store, monkeypatch):
+    monkeypatch.setattr(nd, "NEAR_DUP_MODE", "offer")
+    calls = []
+    summarize = _agent(calls)
+    original = store("a.txt", ORDER)
+    copy = store("c.txt", ORDER + "\nCertified true copy issued on 15th April 2024.")
+    summarize(original)
+    summarize(copy)
+    summarize(copy)
+    assert calls == [original, copy]  # second call is an exact hit
+    assert [r["decision"] for r in nd.recent_audit()] == ["exact"]
+
+    offer = nd.find_duplicate(copy)
+    nd.audit_offer(copy, offer)
+    assert [r["decision"] for r in nd.recent_audit(1)] == ["offered"]
@@ -0,0 +1,92 @@
+import threading
+import time
+from concurrent.futures import CancelledError
+
+import pytest
+
+from services.scheduler import BACKGROUND, FOREGROUND, INTERACTIVE, AgentScheduler
+
+
+@pytest.fixture
+def blocked():
+    """A one-worker scheduler whose worker is busy until `release()` is called."""
+    scheduler = AgentScheduler(workers=1)
+    gate, started = threading.Event(), threading.Event()
+    scheduler.submit(lambda: (started.set(), gate.wait(5)), session_id="busy")
+    started.wait(5)
+    scheduler.release = gate.set
+    yield scheduler
+    gate.set()
+
+
+def _record(order, name):
+    return lambda: order.append(name)
+
+
+def test_queued_calls_run_by_priority(blocked):
+    order = []
+    futures = [
+        blocked.submit(_record(order, "timeline"), agent="timeline", priority=BACKGROUND),
+        blocked.submit(_record(order, "glance"), agent="glance", priority=FOREGROUND),
+        blocked.submit(_record(order, "thinker"), agent="thinker", priority=INTERACTIVE),
+        blocked.submit(_record(order, "graph"), agent="graph", priority=BACKGROUND),
+    ]
+    blocked.release()
+    for future in futures:
+        future.result(5)
+    assert order == ["thinker", "glance", "timeline", "graph"]
+
+
+def test_promote_moves_background_call_ahead(blocked):
+    order = []
+    futures = [
+        blocked.submit(_record(order, "glance"), agent="glance", session_id="sid", priority=FOREGROUND),
+        blocked.submit(_record(order, "graph"), agent="graph", session_id="sid", priority=BACKGROUND),
+    ]
+    assert blocked.promote("sid", "graph", INTERACTIVE) == 1
+    blocked.release()
+    for future in futures:
+        future.result(5)
+    assert order == ["graph", "glance"]
+
+
+def test_cancel_by_session_and_by_page(blocked):
+    page1 = blocked.submit(lambda: "p1", agent="timeline", session_id="sid:tok1")
+    page2 = blocked.submit(lambda: "p2", agent="timeline", session_id="sid:tok2")
+    other = blocked.submit(lambda: "x", agent="timeline", session_id="sidney:tok")
+
+    assert blocked.cancel_session("sid:tok1") == 1
+    assert page1.cancelled() and not page2.cancelled()
+
+    assert blocked.cancel_session("sid") == 1
+    assert page2.cancelled() and not other.cancelled()
+
+    blocked.release()
+    assert other.result(5) == "x"
+    assert "sid:tok1" not in blocked._queued and "sid:tok2" not in blocked._queued
+
+
+def test_cancelled_call_raises_from_run(blocked):
+    result = {}
+
+    def wait_for_call():
+        try:
+            blocked.run(lambda: "done", agent="jargons", session_id="sid:tok")
+        except CancelledError:
+            result["cancelled"] = True
+
+    waiter = threading.Thread(target=wait_for_call)
+    waiter.start()
+    deadline = time.time() + 5
+    while "sid:tok" not in blocked._queued and time.time() < deadline:
+        time.sleep(0.01)
+    blocked.cancel_session("sid:tok")
+    waiter.join(5)
+    assert result == {"cancelled": True}
+
+
+def test_finished_keys_are_dropped(blocked):
+    future = blocked.submit(lambda: "ok", agent="summary", session_id="batch:job1")
+    blocked.release()
+    assert future.result(5) == "ok"
+    assert "batch:job1" not in blocked._queued